@@ -0,0 +1,266 @@
+"""Response cache for Gemini calls.
+
+Two tiers sit in front of a model call:
+- exact: sha256 of the rendered prompt -> reply, in an in-process LRU with a
+  TTL (optionally mirrored to Redis so every worker shares hits);
+- semantic (opt-in): cosine similarity between prompt embeddings, so a
+  near-identical conversation reuses a recent reply. Entries are partitioned
+  by an optional scope (e.g. the user's goal) and only match within it.
+
+numpy and redis are optional; the matching tier is disabled when missing.
+TTLCache is the plain in-process LRU underneath, also used directly for
+structured (non-text) results. SingleFlight collapses concurrent misses for
+the same key onto one upstream call.
+"""
+
+import asyncio
+import hashlib
+import logging
+import math
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import redis.asyncio as redis_asyncio
+except ImportError:
+    redis_asyncio = None
+
+logger = logging.getLogger(__name__)
+
+EmbedFn = Callable[[str], Awaitable[List[float]]]
+
+
+def make_key(*parts: str) -> str:
+    """Stable cache key for the given prompt parts."""
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part.encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+class TTLCache:
+    """In-process LRU mapping with a per-entry time-to-live."""
+
+    def __init__(
+        self,
+        *,
+        ttl_s: float,
+        max_entries: int = 1024,
+        on_evict: Optional[Callable[[str], None]] = None,
+    ):
+        self.ttl_s = ttl_s
+        self.max_entries = max(1, max_entries)
+        self._on_evict = on_evict
+        # key -> (expires_at, value); insertion order doubles as LRU order.
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            self.pop(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        if self.ttl_s <= 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl_s, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self.pop(oldest)
+
+    def pop(self, key: str) -> None:
+        if self._entries.pop(key, None) is not None and self._on_evict is not None:
+            self._on_evict(key)
+
+
+class SingleFlight:
+    """Share one in-flight call between concurrent callers of the same key."""
+
+    def __init__(self):
+        self._inflight: Dict[str, "asyncio.Future[Any]"] = {}
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    async def do(self, key: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(call())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, key=key: self._forget(key, t))
+        # Shielded so one caller disconnecting doesn't cancel the others' call.
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: "asyncio.Future[Any]") -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+
+class LLMCache:
+    """Exact + optional semantic cache for LLM text replies."""
+
+    def __init__(
+        self,
+        *,
+        namespace: str,
+        ttl_s: float = 3600.0,
+        max_entries: int = 1024,
+        embed_fn: Optional[EmbedFn] = None,
+        similarity_threshold: float = 0.92,
+        redis_url: Optional[str] = None,
+    ):
+        self.namespace = namespace
+        self.ttl_s = ttl_s
+        self.similarity_threshold = similarity_threshold
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+        self._entries = TTLCache(ttl_s=ttl_s, max_entries=max_entries, on_evict=self._drop_vector)
+        # scope -> {key -> unit-normalized embedding}, for the semantic tier.
+        self._vectors: Dict[str, "OrderedDict[str, object]"] = {}
+        self._scope_of: Dict[str, str] = {}
+        # scope -> (keys, stacked matrix), rebuilt lazily per scope.
+        self._matrices: Dict[str, Tuple[List[str], object]] = {}
+
+        self._embed_fn = embed_fn
+        if embed_fn is not None and np is None:
+            logger.warning("⚠ numpy not installed; semantic LLM cache disabled.")
+            self._embed_fn = None
+
+        self._redis = None
+        if redis_url:
+            if redis_asyncio is None:
+                logger.warning("⚠ redis not installed; LLM cache stays in-process.")
+            else:
+                self._redis = redis_asyncio.from_url(redis_url)
+
+    async def get_or_call(
+        self,
+        key: str,
+        call: Callable[[], Awaitable[str]],
+        *,
+        semantic_text: Optional[str] = None,
+        semantic_scope: str = "",
+    ) -> str:
+        """Return a cached reply for `key`, or await `call()` and store it.
+
+        Semantic matches are only considered among entries stored with the
+        same `semantic_scope`.
+        """
+
+        if self.ttl_s <= 0:
+            return await call()
+
+        value = self._entries.get(key)
+        if value is None and self._redis is not None:
+            value = await self._get_redis(key)
+            if value is not None:
+                self._entries.set(key, value)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        vector = None
+        if self._embed_fn is not None and semantic_text:
+            vector = await self._embed(semantic_text)
+            if vector is not None:
+                value = self._nearest(vector, semantic_scope)
+                if value is not None:
+                    self.semantic_hits += 1
+                    return value
+
+        self.misses += 1
+        value = await call()
+        self._entries.set(key, value)
+        if vector is not None:
+            self._put_vector(key, vector, semantic_scope)
+        if self._redis is not None:
+            await self._set_redis(key, value)
+        return value
+
+    def _drop_vector(self, key: str) -> None:
+        scope = self._scope_of.pop(key, None)
+        if scope is None:
+            return
+        vectors = self._vectors[scope]
+        vectors.pop(key, None)
+        self._matrices.pop(scope, None)
+        if not vectors:
+            del self._vectors[scope]
+
+    def _put_vector(self, key: str, vector, scope: str) -> None:
+        if key in self._entries:
+            self._drop_vector(key)
+            self._vectors.setdefault(scope, OrderedDict())[key] = vector
+            self._scope_of[key] = scope
+            self._matrices.pop(scope, None)
+
+    async def _embed(self, text: str):
+        try:
+            raw = await self._embed_fn(text)
+        except Exception as e:
+            logger.warning(f"⚠ LLM cache embedding failed: {e}")
+            return None
+        vec = np.asarray(raw, dtype=np.float32)
+        norm = float(np.linalg.norm(vec))
+        if not norm:
+            return None
+        return vec / norm
+
+    def _nearest(self, vector, scope: str) -> Optional[str]:
+        vectors = self._vectors.get(scope)
+        if not vectors:
+            return None
+        cached = self._matrices.get(scope)
+        if cached is None:
+            # Rebuilt lazily only after inserts/evictions in this scope.
+            keys = list(vectors.keys())
+            cached = (keys, np.stack([vectors[k] for k in keys]))
+            self._matrices[scope] = cached
+        keys, matrix = cached
+        scores = matrix @ vector
+        best = int(np.argmax(scores))
+        if float(scores[best]) < self.similarity_threshold:
+            return None
+        return self._entries.get(keys[best])
+
+    async def _get_redis(self, key: str) -> Optional[str]:
+        try:
+            raw = await self._redis.get(f"{self.namespace}:{key}")
+        except Exception as e:
+            logger.warning(f"⚠ LLM cache Redis read failed: {e}")
+            return None
+        if raw is None:
+            return None
+        return raw.decode("utf-8") if isinstance(raw, bytes) else str(raw)
+
+    async def _set_redis(self, key: str, value: str) -> None:
+        if self.ttl_s <= 0:
+            return
+        try:
+            # Redis rejects EX 0, so round sub-second TTLs up.
+            await self._redis.set(
+                f"{self.namespace}:{key}", value, ex=max(1, math.ceil(self.ttl_s))
+            )
+        except Exception as e:
+            logger.warning(f"⚠ LLM cache Redis write failed: {e}")
@@ -1,41 +1,151 @@
 import argparse
-import datetime as _dt
-import inspect
+import contextvars
+import functools
+import http.client
 import json
 import os
+import queue
 import sys
+import threading
 import time
-import urllib.error
-import urllib.request
-from typing import Any, Dict, List, Optional, Tuple
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from types import MappingProxyType
+from typing import Any, Dict, FrozenSet, List, Mapping, Optional, Tuple
+
+# Environment is read once at import; none of these change during a run
+# (except OPIK_PROJECT_NAME, which _try_configure_opik may fill in).
+_RUN_ENV_KEYS = (
+    "PROMPT_VERSION",
+    "GEMINI_MODEL",
+    "RETRY_ON_LOW_EMPATHY",
+    "RETRY_EMPATHY_THRESHOLD",
+    "OPIK_PROJECT_NAME",
+)
+_ENV_SNAPSHOT: Mapping[str, Optional[str]] = MappingProxyType(
+    {
+        k: os.environ.get(k)
+        for k in _RUN_ENV_KEYS
+        + (
+            "OPIK_API_KEY",
+            "COMET_API_KEY",
+            "OPIK_WORKSPACE",
+            "COMET_WORKSPACE",
+            "OPIK_URL",
+            "API_BASE_URL",
+            "EXPERIMENT_LABEL",
+            "EXPERIMENT_TIMEOUT_S",
+            "EXPERIMENT_SOFT_TIMEOUT_S",
+            "EXPERIMENT_CONCURRENCY",
+            "OPIK_DISABLE",
+        )
+    }
+)
+
+
+def _env(name: str, default: Optional[str] = None) -> Optional[str]:
+    value = _ENV_SNAPSHOT.get(name)
+    return default if value is None else value
+
+
+# Optional Opik integration. The SDK is heavy, so it is only imported by
+# _load_opik() (from _try_configure_opik), not for --help or bad arguments.
+OPIK_AVAILABLE: Optional[bool] = None
+_opik_configure = None
+_opik_track = None
+
+
+def _opik_disabled() -> bool:
+    return str(_env("OPIK_DISABLE", "")).strip().lower() in {"1", "true", "yes", "on"}
+
+
+def _load_opik() -> bool:
+    global OPIK_AVAILABLE, _opik_configure, _opik_track
+    if OPIK_AVAILABLE is None:
+        try:
+            from opik import configure as _opik_configure, track as _opik_track
+
+            OPIK_AVAILABLE = True
+        except Exception:
+            OPIK_AVAILABLE = False
+    return OPIK_AVAILABLE
+
+
+def track(*args, **kwargs):
+    """Lazy stand-in for opik.track.
+
+    The real decorator is applied on the first call made after _load_opik();
+    without the SDK the function runs undecorated.
+    """
+
+    def _decorator(fn):
+        tracked = None
+
+        @functools.wraps(fn)
+        def _wrapper(*a, **kw):
+            nonlocal tracked
+            if tracked is None:
+                if OPIK_AVAILABLE is None:
+                    return fn(*a, **kw)
+                tracked = _opik_track(*args, **kwargs)(fn) if OPIK_AVAILABLE else fn
+            return tracked(*a, **kw)
 
-# Optional Opik integration
+        return _wrapper
+
+    return _decorator
+
+
+# Optional fast JSON (falls back to stdlib json)
 try:
-    from opik import configure, track
+    import orjson
 
-    OPIK_AVAILABLE = True
+    ORJSON_AVAILABLE = True
 except Exception:
-    OPIK_AVAILABLE = False
+    orjson = None
+    ORJSON_AVAILABLE = False
 
-    def configure(*args, **kwargs):
-        return None
 
-    def track(*args, **kwargs):
-        def _decorator(fn):
-            return fn
+def _json_dumps(obj: Any, *, indent: bool = False, non_str_keys: bool = False) -> bytes:
+    if ORJSON_AVAILABLE:
+        option = orjson.OPT_INDENT_2 if indent else 0
+        if non_str_keys:
+            option |= orjson.OPT_NON_STR_KEYS
+        return orjson.dumps(obj, option=option)
+    # stdlib json already stringifies int/float/bool dict keys.
+    return json.dumps(obj, ensure_ascii=False, indent=2 if indent else None).encode("utf-8")
+
 
-        return _decorator
+def _json_loads(raw: bytes) -> Any:
+    if ORJSON_AVAILABLE:
+        return orjson.loads(raw)
+    return json.loads(raw.decode("utf-8"))
+
+
+@functools.lru_cache(maxsize=1)
+def _get_opik_kwargs_shape() -> Tuple[FrozenSet[str], bool]:
+    """Return (supported configure() parameter names, workspace_required).
+
+    Reflecting on the installed SDK's signature is only done once per process.
+    """
+    import inspect
+
+    params = inspect.signature(_opik_configure).parameters
+    workspace = params.get("workspace")
+    workspace_required = workspace is not None and workspace.default is inspect.Parameter.empty
+    return frozenset(params), workspace_required
 
 
 def _try_configure_opik() -> Tuple[bool, Optional[str]]:
-    if not OPIK_AVAILABLE:
+    if _opik_disabled():
+        return False, "disabled via OPIK_DISABLE"
+    if not _load_opik():
         return False, "opik SDK not installed"
 
     try:
-        opik_api_key = os.getenv("OPIK_API_KEY") or os.getenv("COMET_API_KEY")
-        opik_workspace = os.getenv("OPIK_WORKSPACE") or os.getenv("COMET_WORKSPACE")
-        opik_project = os.getenv("OPIK_PROJECT_NAME", "flexifit-hackathon")
-        opik_url = os.getenv("OPIK_URL")
+        opik_api_key = _env("OPIK_API_KEY") or _env("COMET_API_KEY")
+        opik_workspace = _env("OPIK_WORKSPACE") or _env("COMET_WORKSPACE")
+        opik_project = _env("OPIK_PROJECT_NAME", "flexifit-hackathon")
+        opik_url = _env("OPIK_URL")
 
         if not opik_api_key:
             return False, "OPIK_API_KEY not set"
@@ -47,13 +157,11 @@ def _try_configure_opik() -> Tuple[bool, Optional[str]]:
         os.environ.setdefault("OPIK_PROJECT_NAME", opik_project)
         os.environ.setdefault("COMET_PROJECT_NAME", opik_project)
 
-        sig = inspect.signature(configure)
+        supported, workspace_required = _get_opik_kwargs_shape()
         kwargs: Dict[str, Any] = {}
-        if "api_key" in sig.parameters:
+        if "api_key" in supported:
             kwargs["api_key"] = opik_api_key
-        if "workspace" in sig.parameters:
-            workspace_param = sig.parameters["workspace"]
-            workspace_required = workspace_param.default is inspect._empty
+        if "workspace" in supported:
             if workspace_required and not opik_workspace:
                 return (
                     False,
@@ -61,63 +169,153 @@ def _try_configure_opik() -> Tuple[bool, Optional[str]]:
                 )
             if opik_workspace:
                 kwargs["workspace"] = opik_workspace
-        if "url" in sig.parameters and opik_url:
+        if "url" in supported and opik_url:
             kwargs["url"] = opik_url
-        if "project_name" in sig.parameters:
+        if "project_name" in supported:
             kwargs["project_name"] = opik_project
-        elif "project" in sig.parameters:
+        elif "project" in supported:
             kwargs["project"] = opik_project
 
-        configure(**kwargs)
+        _opik_configure(**kwargs)
         return True, None
     except Exception as e:
         return False, str(e)
 
 
-def _http_post_json(url: str, payload: Dict[str, Any], timeout_s: int) -> Dict[str, Any]:
-    body = json.dumps(payload).encode("utf-8")
-    req = urllib.request.Request(
-        url,
-        data=body,
-        headers={"Content-Type": "application/json"},
-        method="POST",
-    )
-    try:
-        with urllib.request.urlopen(req, timeout=timeout_s) as resp:
-            raw = resp.read().decode("utf-8")
-            return json.loads(raw)
-    except urllib.error.HTTPError as e:
-        raw = e.read().decode("utf-8", errors="ignore") if e.fp else ""
-        raise RuntimeError(f"HTTP {e.code} from {url}: {raw[:400]}")
-
-
-DEFAULT_DATASET: List[Dict[str, str]] = [
-    {
-        "id": "tired",
-        "goal": "Run 5km every day",
-        "message": "I'm exhausted and I hate running.",
-    },
-    {
-        "id": "busy",
-        "goal": "Workout 1 hour",
-        "message": "I only have 2 minutes today.",
-    },
-    {
-        "id": "lazy",
-        "goal": "Read 20 pages",
-        "message": "I feel lazy. Convince me without making me feel guilty.",
-    },
-    {
-        "id": "anxious",
-        "goal": "Meditate 10 minutes",
-        "message": "I'm anxious and can't focus.",
-    },
-    {
-        "id": "motivated",
-        "goal": "Drink 2L water",
-        "message": "Ready for action. Give me a concrete plan.",
-    },
-]
+class HTTPStatusError(RuntimeError):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class ConnectionPool:
+    """Keep-alive connections shared by one run's worker threads.
+
+    Holds up to `size` idle connections per (scheme, host), so any worker can
+    reuse a socket another worker finished with. close() shuts them all.
+    """
+
+    def __init__(self, size: int):
+        self.size = max(1, size)
+        self._idle: Dict[Tuple[str, str], List[http.client.HTTPConnection]] = {}
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def acquire(self, scheme: str, netloc: str, timeout_s: int) -> http.client.HTTPConnection:
+        with self._lock:
+            idle = self._idle.get((scheme, netloc))
+            conn = idle.pop() if idle else None
+        if conn is None:
+            conn_cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+            return conn_cls(netloc, timeout=timeout_s)
+        conn.timeout = timeout_s
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout_s)
+        return conn
+
+    def release(self, scheme: str, netloc: str, conn: http.client.HTTPConnection) -> None:
+        with self._lock:
+            if not self._closed:
+                idle = self._idle.setdefault((scheme, netloc), [])
+                if len(idle) < self.size:
+                    idle.append(conn)
+                    return
+        conn.close()
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
+
+
+# Shared by every request; http.client only reads it.
+_HEADERS: Dict[str, str] = {
+    "Content-Type": "application/json",
+    "Accept": "application/json",
+    "Connection": "keep-alive",
+}
+
+
+@functools.lru_cache(maxsize=32)
+def _split_url(url: str) -> Tuple[str, str, str]:
+    """Return (scheme, netloc, path-with-query); every case posts to the same URL."""
+    parts = urllib.parse.urlsplit(url)
+    path = parts.path or "/"
+    if parts.query:
+        path = f"{path}?{parts.query}"
+    return parts.scheme, parts.netloc, path
+
+
+def _http_post_json(
+    url: str,
+    payload: Dict[str, Any],
+    timeout_s: int,
+    pool: ConnectionPool,
+) -> Dict[str, Any]:
+    scheme, netloc, path = _split_url(url)
+    body = _json_dumps(payload)
+
+    # A pooled socket may have been closed by the server while idle; reconnect once.
+    for attempt in range(2):
+        conn = pool.acquire(scheme, netloc, timeout_s)
+        try:
+            conn.request("POST", path, body=body, headers=_HEADERS)
+            resp = conn.getresponse()
+            raw = resp.read()
+        except ConnectionError:
+            conn.close()
+            if attempt:
+                raise
+            continue
+        except Exception:
+            conn.close()
+            raise
+        pool.release(scheme, netloc, conn)
+
+        if resp.status >= 400:
+            text = raw.decode("utf-8", errors="ignore")
+            raise HTTPStatusError(resp.status, f"HTTP {resp.status} from {url}: {text[:400]}")
+        return _json_loads(raw)
+
+    raise RuntimeError(f"Could not reach {url}")
+
+
+MAX_WORKERS = 8
+
+# Read-only and shared by every worker thread.
+DEFAULT_DATASET: Tuple[Mapping[str, str], ...] = tuple(
+    MappingProxyType(case)
+    for case in [
+        {
+            "id": "tired",
+            "goal": "Run 5km every day",
+            "message": "I'm exhausted and I hate running.",
+        },
+        {
+            "id": "busy",
+            "goal": "Workout 1 hour",
+            "message": "I only have 2 minutes today.",
+        },
+        {
+            "id": "lazy",
+            "goal": "Read 20 pages",
+            "message": "I feel lazy. Convince me without making me feel guilty.",
+        },
+        {
+            "id": "anxious",
+            "goal": "Meditate 10 minutes",
+            "message": "I'm anxious and can't focus.",
+        },
+        {
+            "id": "motivated",
+            "goal": "Drink 2L water",
+            "message": "Ready for action. Give me a concrete plan.",
+        },
+    ]
+)
 
 
 @track(
@@ -129,110 +327,349 @@ def run_experiment(
     run_id: str,
     label: str,
     timeout_s: int,
+    batch: bool = False,
+    soft_timeout_s: Optional[int] = None,
+    include_scores: bool = False,
+    concurrency: int = MAX_WORKERS,
 ) -> Dict[str, Any]:
-    outputs: List[Dict[str, Any]] = []
-    scores: List[float] = []
-
-    for case in DEFAULT_DATASET:
-        out = run_case(
-            base_url=base_url,
-            run_id=run_id,
-            label=label,
-            case=case,
-            timeout_s=timeout_s,
-        )
-        outputs.append(out)
+    root_url = base_url.rstrip("/")
+    chat_url = f"{root_url}/chat"
+    workers = max(1, min(concurrency, len(DEFAULT_DATASET)))
+    # One keep-alive connection per worker, shared across the whole run.
+    pool = ConnectionPool(workers)
 
+    try:
+        outputs: Optional[List[Dict[str, Any]]] = None
+        if batch:
+            outputs = run_batch(
+                batch_url=f"{root_url}/chat/batch",
+                run_id=run_id,
+                label=label,
+                timeout_s=timeout_s,
+                pool=pool,
+            )
+
+        if outputs is None:
+            # Cases are independent, I/O-bound HTTP calls: overlap them. Each task runs
+            # in a copy of the current context so Opik nests case spans under this run.
+            with ThreadPoolExecutor(max_workers=workers) as ex:
+                futures = [
+                    ex.submit(
+                        contextvars.copy_context().run,
+                        run_case,
+                        chat_url=chat_url,
+                        run_id=run_id,
+                        label=label,
+                        case=case,
+                        timeout_s=timeout_s,
+                        soft_timeout_s=soft_timeout_s,
+                        pool=pool,
+                    )
+                    for case in DEFAULT_DATASET
+                ]
+                # Submission order keeps the output deterministic.
+                outputs = [f.result() for f in futures]
+    finally:
+        pool.close()
+
+    # Single pass: running mean, plus the raw list only when requested.
+    total, n = 0.0, 0
+    scores: List[float] = []
+    timed_out_cases: List[Any] = []
+    failed_cases: List[Any] = []
+    for out in outputs:
+        if out.get("timed_out"):
+            timed_out_cases.append(out.get("case_id"))
+            continue
+        if out.get("error"):
+            failed_cases.append(out.get("case_id"))
+            continue
         s = out.get("empathy_score")
-        if isinstance(s, (int, float)):
-            scores.append(float(s))
-
-    avg = sum(scores) / len(scores) if scores else 0.0
-    return {
+        # Scores come from JSON, so they are exactly float or int (never bool).
+        if type(s) is float:
+            pass
+        elif type(s) is int:
+            s = float(s)
+        else:
+            continue
+        total += s
+        n += 1
+        if include_scores:
+            scores.append(s)
+
+    summary: Dict[str, Any] = {
         "run_id": run_id,
         "label": label,
         "base_url": base_url,
         "cases": len(outputs),
-        "avg_empathy": round(avg, 3),
-        "scores": scores,
-        "outputs": outputs,
-        "env": {
-            "PROMPT_VERSION": os.getenv("PROMPT_VERSION"),
-            "GEMINI_MODEL": os.getenv("GEMINI_MODEL"),
-            "RETRY_ON_LOW_EMPATHY": os.getenv("RETRY_ON_LOW_EMPATHY"),
-            "RETRY_EMPATHY_THRESHOLD": os.getenv("RETRY_EMPATHY_THRESHOLD"),
-            "OPIK_PROJECT_NAME": os.getenv("OPIK_PROJECT_NAME"),
-        },
+        "avg_empathy": round(total / n, 3) if n else 0.0,
+        # Timed-out cases have no score and are excluded from avg_empathy.
+        "timed_out": len(timed_out_cases),
+        "timed_out_cases": timed_out_cases,
+        # Cases the batch endpoint reported as failed; also excluded.
+        "failed": len(failed_cases),
+        "failed_cases": failed_cases,
     }
+    if include_scores:
+        summary["scores"] = scores
+    summary["outputs"] = outputs
+    summary["env"] = {k: _ENV_SNAPSHOT[k] for k in _RUN_ENV_KEYS}
+    # _try_configure_opik may default the project name after import.
+    summary["env"]["OPIK_PROJECT_NAME"] = os.environ.get("OPIK_PROJECT_NAME")
+    return summary
 
 
 @track(
     name="flexifit_experiment_case",
     tags=["experiment", "eval", "llm-as-judge"],
+    ignore_arguments=["pool"],
 )
 def run_case(
-    base_url: str,
+    chat_url: str,
     run_id: str,
     label: str,
-    case: Dict[str, str],
+    case: Mapping[str, str],
     timeout_s: int,
+    soft_timeout_s: Optional[int] = None,
+    *,
+    pool: ConnectionPool,
+) -> Dict[str, Any]:
+    # With a soft deadline, abandon a stalled first attempt early and spend the
+    # rest of the budget on one retry instead of waiting out the full timeout.
+    if soft_timeout_s and 0 < soft_timeout_s < timeout_s:
+        attempt_timeouts = [soft_timeout_s, timeout_s - soft_timeout_s]
+    else:
+        attempt_timeouts = [timeout_s]
+
+    payload = _chat_payload(case)
+    started = time.perf_counter_ns()
+    for attempt_timeout in attempt_timeouts:
+        try:
+            result = _http_post_json(chat_url, payload, timeout_s=attempt_timeout, pool=pool)
+            break
+        except TimeoutError:
+            continue
+    else:
+        # Keep the run going; the case is reported as timed out in the summary.
+        duration_ms = (time.perf_counter_ns() - started) // 1_000_000
+        return _case_output(run_id, label, case, {}, duration_ms, timed_out=True)
+    duration_ms = (time.perf_counter_ns() - started) // 1_000_000
+
+    return _case_output(run_id, label, case, result, duration_ms)
+
+
+@track(
+    name="flexifit_experiment_batch",
+    tags=["experiment", "eval", "llm-as-judge", "batch"],
+    ignore_arguments=["pool"],
+)
+def run_batch(
+    batch_url: str,
+    run_id: str,
+    label: str,
+    timeout_s: int,
+    *,
+    pool: ConnectionPool,
+) -> Optional[List[Dict[str, Any]]]:
+    """Submit every case in a single POST to /chat/batch.
+
+    Returns None when the batch request fails (missing endpoint or any
+    non-2xx), so the caller can fall back to one request per case.
+    """
+    payload = {"cases": [_chat_payload(case) for case in DEFAULT_DATASET]}
+
+    started = time.perf_counter_ns()
+    try:
+        result = _http_post_json(
+            batch_url,
+            payload,
+            timeout_s=timeout_s * len(DEFAULT_DATASET),
+            pool=pool,
+        )
+    except HTTPStatusError as e:
+        print(f"⚠ /chat/batch unavailable ({e.status}); running cases individually", file=sys.stderr)
+        return None
+    duration_ms = (time.perf_counter_ns() - started) // 1_000_000
+
+    results = result.get("results") or []
+    if len(results) != len(DEFAULT_DATASET):
+        raise RuntimeError(
+            f"Batch returned {len(results)} results for {len(DEFAULT_DATASET)} cases"
+        )
+
+    # Cases share one round trip, so each reports the batch duration.
+    return [
+        record_batch_case(run_id, label, case, res, duration_ms)
+        for case, res in zip(DEFAULT_DATASET, results)
+    ]
+
+
+@track(
+    name="flexifit_experiment_case",
+    tags=["experiment", "eval", "llm-as-judge", "batch"],
+)
+def record_batch_case(
+    run_id: str,
+    label: str,
+    case: Mapping[str, str],
+    result: Dict[str, Any],
+    duration_ms: int,
 ) -> Dict[str, Any]:
-    payload = {
+    """Per-case span for batch runs, matching the one run_case emits."""
+    return _case_output(run_id, label, case, result, duration_ms)
+
+
+def _chat_payload(case: Mapping[str, str]) -> Dict[str, Any]:
+    return {
         "user_message": case["message"],
         "current_goal": case["goal"],
         "chat_history": [],
     }
 
-    started = time.time()
-    result = _http_post_json(f"{base_url.rstrip('/')}/chat", payload, timeout_s=timeout_s)
-    duration_ms = int((time.time() - started) * 1000)
 
+# /chat response fields copied into each case output, in output order.
+_RESULT_KEYS = (
+    "response",
+    "empathy_score",
+    "empathy_rationale",
+    "prompt_version",
+    "retry_used",
+    "initial_empathy_score",
+    "error",
+)
+_OUTPUT_KEYS = (
+    "run_id",
+    "label",
+    "case_id",
+    "goal",
+    "user_message",
+    "ai_response",
+    "empathy_score",
+    "empathy_rationale",
+    "prompt_version",
+    "retry_used",
+    "initial_empathy_score",
+    "error",
+    "duration_ms",
+    "timed_out",
+)
+
+
+def _case_output(
+    run_id: str,
+    label: str,
+    case: Mapping[str, str],
+    result: Dict[str, Any],
+    duration_ms: int,
+    timed_out: bool = False,
+) -> Dict[str, Any]:
     # Return a compact dict so Opik trace output is readable.
-    return {
-        "run_id": run_id,
-        "label": label,
-        "case_id": case.get("id"),
-        "goal": case.get("goal"),
-        "user_message": case.get("message"),
-        "ai_response": result.get("response"),
-        "empathy_score": result.get("empathy_score"),
-        "empathy_rationale": result.get("empathy_rationale"),
-        "prompt_version": result.get("prompt_version"),
-        "retry_used": result.get("retry_used"),
-        "initial_empathy_score": result.get("initial_empathy_score"),
-        "duration_ms": duration_ms,
-    }
+    return dict(
+        zip(
+            _OUTPUT_KEYS,
+            (
+                run_id,
+                label,
+                case.get("id"),
+                case.get("goal"),
+                case.get("message"),
+                *map(result.get, _RESULT_KEYS),
+                duration_ms,
+                timed_out,
+            ),
+        )
+    )
 
 
-def main() -> int:
+def _build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(
         description="Run a small golden-dataset experiment against the FlexiFit backend and log traces to Opik."
     )
     parser.add_argument(
         "--base-url",
-        default=os.getenv("API_BASE_URL", "http://localhost:8000"),
+        default=_env("API_BASE_URL", "http://localhost:8000"),
         help="Backend base URL (default: API_BASE_URL env or http://localhost:8000)",
     )
     parser.add_argument(
         "--label",
-        default=os.getenv("EXPERIMENT_LABEL", "local"),
+        default=_env("EXPERIMENT_LABEL", "local"),
         help="Experiment label (e.g., v1, v2, gemini-flash, retry-on)",
     )
     parser.add_argument(
         "--timeout",
         type=int,
-        default=int(os.getenv("EXPERIMENT_TIMEOUT_S", "20")),
+        default=int(_env("EXPERIMENT_TIMEOUT_S", "20")),
         help="Per-case timeout in seconds (default: 20)",
     )
-    args = parser.parse_args()
+    parser.add_argument(
+        "--soft-timeout",
+        type=int,
+        default=int(_env("EXPERIMENT_SOFT_TIMEOUT_S", "0")),
+        help="Abandon and retry a case once after this many seconds (default: 0, disabled)",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=int(_env("EXPERIMENT_CONCURRENCY", str(MAX_WORKERS))),
+        help=f"Max cases in flight at once (default: {MAX_WORKERS})",
+    )
+    parser.add_argument(
+        "--compact",
+        action="store_true",
+        help="Write the summary JSON without indentation (smaller/faster for large datasets)",
+    )
+    parser.add_argument(
+        "--include-scores",
+        action="store_true",
+        help="Also include the flat list of empathy scores in the summary",
+    )
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="Submit all cases in one request to /chat/batch (falls back to per-case calls if missing)",
+    )
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="Read JSONL run requests ({\"label\", \"base_url\"}) from stdin and emit JSONL results",
+    )
+    parser.add_argument(
+        "--batch-window-ms",
+        type=int,
+        default=50,
+        help="In --daemon mode, how long to wait for more requests before starting a batch (default: 50)",
+    )
+    return parser
+
+
+def main() -> int:
+    args = _build_parser().parse_args()
+
+    run_kwargs: Dict[str, Any] = {
+        "timeout_s": args.timeout,
+        "batch": args.batch,
+        "soft_timeout_s": args.soft_timeout,
+        "include_scores": args.include_scores,
+        "concurrency": args.concurrency,
+    }
+
+    # In daemon mode stdout carries JSONL results only.
+    log = sys.stderr if args.daemon else sys.stdout
 
-    opik_ok, opik_err = _try_configure_opik()
-    if opik_ok:
-        print("✓ Opik configured")
+    if _opik_disabled():
+        # Never import the SDK; the lazy @track wrappers stay pass-through.
+        print("⚠ Opik disabled via env", file=log)
     else:
-        print(f"⚠ Opik not configured: {opik_err}. Continuing without Opik logging.")
+        opik_ok, opik_err = _try_configure_opik()
+        if opik_ok:
+            print("✓ Opik configured", file=log)
+        else:
+            print(f"⚠ Opik not configured: {opik_err}. Continuing without Opik logging.", file=log)
 
-    run_id = _dt.datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+    if args.daemon:
+        return _serve_runs(args, run_kwargs)
+
+    run_id = _new_run_id()
     base_url = args.base_url
     label = args.label
 
@@ -243,30 +680,168 @@ def main() -> int:
             base_url=base_url,
             run_id=run_id,
             label=label,
-            timeout_s=args.timeout,
+            **run_kwargs,
         )
     except Exception as e:
         print(f"ERROR running experiment: {e}")
         return 2
 
-    # Keep console output short and demo-friendly.
-    for out in summary.get("outputs", []):
-        case_id = out.get("case_id")
-        print(
-            f"- {case_id}: empathy={out.get('empathy_score')} retry={out.get('retry_used')} duration_ms={out.get('duration_ms')}"
-        )
+    # Keep console output short and demo-friendly; one write for all cases.
+    lines = [
+        f"- {out.get('case_id')}: empathy={out.get('empathy_score')} retry={out.get('retry_used')} duration_ms={out.get('duration_ms')}"
+        + (" TIMED OUT" if out.get("timed_out") else "")
+        + (f" ERROR: {out.get('error')}" if out.get("error") else "")
+        for out in summary.get("outputs", [])
+    ]
+    if lines:
+        sys.stdout.write("\n".join(lines) + "\n")
 
-    out_path = os.path.join(os.path.dirname(__file__), f"experiment_{run_id}_{label}.json")
     try:
-        with open(out_path, "w", encoding="utf-8") as f:
-            json.dump(summary, f, ensure_ascii=False, indent=2)
+        out_path = _save_summary(summary, compact=args.compact)
         print(f"Saved: {out_path}")
     except Exception as e:
         print(f"⚠ Could not write output JSON: {e}")
 
+    if summary["timed_out"]:
+        print(
+            f"⚠ {summary['timed_out']} case(s) timed out and are excluded from the average: "
+            f"{', '.join(map(str, summary['timed_out_cases']))}"
+        )
+    if summary["failed"]:
+        print(
+            f"⚠ {summary['failed']} case(s) failed and are excluded from the average: "
+            f"{', '.join(map(str, summary['failed_cases']))}"
+        )
     print(f"Average empathy (1-5): {summary['avg_empathy']}")
     return 0
 
 
+def _new_run_id() -> str:
+    return time.strftime("%Y%m%dT%H%M%SZ", time.gmtime())
+
+
+def _save_summary(summary: Dict[str, Any], compact: bool = False) -> str:
+    out_path = os.path.join(
+        os.path.dirname(__file__),
+        f"experiment_{summary['run_id']}_{summary['label']}.json",
+    )
+    with open(out_path, "wb") as f:
+        f.write(_json_dumps(summary, indent=not compact, non_str_keys=True))
+    return out_path
+
+
+def _emit(record: Dict[str, Any]) -> None:
+    sys.stdout.write(_json_dumps(record).decode("utf-8") + "\n")
+    sys.stdout.flush()
+
+
+def _read_run_requests(pending: "queue.Queue[Optional[str]]") -> None:
+    for line in sys.stdin:
+        line = line.strip()
+        if line:
+            pending.put(line)
+    pending.put(None)
+
+
+def _run_one(
+    run_id: str,
+    label: str,
+    base_url: str,
+    run_kwargs: Dict[str, Any],
+    compact: bool,
+) -> Dict[str, Any]:
+    record: Dict[str, Any] = {"run_id": run_id, "label": label, "base_url": base_url}
+    try:
+        summary = run_experiment(base_url=base_url, run_id=run_id, label=label, **run_kwargs)
+    except Exception as e:
+        record["error"] = str(e)
+        return record
+
+    record["cases"] = summary["cases"]
+    record["avg_empathy"] = summary["avg_empathy"]
+    record["timed_out"] = summary["timed_out"]
+    record["timed_out_cases"] = summary["timed_out_cases"]
+    record["failed"] = summary["failed"]
+    record["failed_cases"] = summary["failed_cases"]
+    try:
+        record["saved"] = _save_summary(summary, compact=compact)
+    except Exception as e:
+        record["saved"] = None
+        record["save_error"] = str(e)
+    return record
+
+
+def _serve_runs(args: argparse.Namespace, run_kwargs: Dict[str, Any]) -> int:
+    """--daemon loop: amortize interpreter/SDK startup across many runs.
+
+    Each stdin line is a JSON object with optional "label" and "base_url"
+    (defaulting to the CLI values). Requests arriving within --batch-window-ms
+    of the first one are started together; one JSONL result is written per run.
+    """
+    pending: "queue.Queue[Optional[str]]" = queue.Queue()
+    threading.Thread(target=_read_run_requests, args=(pending,), daemon=True).start()
+
+    window_s = max(0, args.batch_window_ms) / 1000.0
+    seq = 0
+    eof = False
+    while not eof:
+        first = pending.get()
+        if first is None:
+            break
+
+        lines = [first]
+        deadline = time.monotonic() + window_s
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                line = pending.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if line is None:
+                eof = True
+                break
+            lines.append(line)
+
+        jobs: List[Tuple[str, str, str]] = []
+        for line in lines:
+            seq += 1
+            try:
+                req = _json_loads(line.encode("utf-8"))
+                if not isinstance(req, dict):
+                    raise ValueError("expected a JSON object")
+            except Exception as e:
+                _emit({"error": f"invalid run request: {e}", "request": line[:200]})
+                continue
+            jobs.append(
+                (
+                    f"{_new_run_id()}-{seq}",
+                    str(req.get("label") or args.label),
+                    str(req.get("base_url") or args.base_url),
+                )
+            )
+        if not jobs:
+            continue
+
+        with ThreadPoolExecutor(max_workers=len(jobs)) as ex:
+            futures = [
+                ex.submit(
+                    contextvars.copy_context().run,
+                    _run_one,
+                    run_id,
+                    label,
+                    base_url,
+                    run_kwargs,
+                    args.compact,
+                )
+                for run_id, label, base_url in jobs
+            ]
+            for f in futures:
+                _emit(f.result())
+
+    return 0
+
+
 if __name__ == "__main__":
     raise SystemExit(main())
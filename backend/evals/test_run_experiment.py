@@ -0,0 +1,19 @@
+import importlib
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import run_experiment  # noqa: E402
+
+
+def test_soft_timeout_default_reads_env(monkeypatch):
+    monkeypatch.setenv("EXPERIMENT_SOFT_TIMEOUT_S", "7")
+    mod = importlib.reload(run_experiment)
+    assert mod._build_parser().parse_args([]).soft_timeout == 7
+
+
+def test_soft_timeout_default_is_disabled(monkeypatch):
+    monkeypatch.delenv("EXPERIMENT_SOFT_TIMEOUT_S", raising=False)
+    mod = importlib.reload(run_experiment)
+    assert mod._build_parser().parse_args([]).soft_timeout == 0
@@ -1,19 +1,41 @@
 import os
+import asyncio
 import json
 import re
 import time
+import random
 import inspect
+import contextvars
+from collections import deque
 import uvicorn
+from functools import lru_cache, partial
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi import Request
+from fastapi.responses import JSONResponse, ORJSONResponse, Response
 from pydantic import BaseModel
 from typing import List, Optional, Any
 import google.generativeai as genai
-from google.api_core.exceptions import DeadlineExceeded, Unauthenticated, ResourceExhausted
+import google.ai.generativelanguage as glm
+from google.ai.generativelanguage_v1beta.services.generative_service.transports.grpc_asyncio import (
+    GenerativeServiceGrpcAsyncIOTransport,
+)
+from google.api_core.exceptions import (
+    DeadlineExceeded,
+    ResourceExhausted,
+    ServiceUnavailable,
+    Unauthenticated,
+)
 from dotenv import load_dotenv
+from cache import LLMCache, SingleFlight, TTLCache, make_key
 import logging
 
+def _noop_track(*args, **kwargs):
+    def _decorator(fn):
+        return fn
+
+    return _decorator
+
+
 try:
     from opik import configure, track
     OPIK_AVAILABLE = True
@@ -23,18 +45,23 @@ except Exception:
     def configure(*args, **kwargs):
         return None
 
-    def track(*args, **kwargs):
-        def _decorator(fn):
-            return fn
+    track = _noop_track
+
+try:
+    import orjson
 
-        return _decorator
+    _json_loads = orjson.loads
+    _DEFAULT_RESPONSE_CLASS = ORJSONResponse
+except ImportError:
+    _json_loads = json.loads
+    _DEFAULT_RESPONSE_CLASS = JSONResponse
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-_ID_STOPWORDS = {
+_ID_STOPWORDS = frozenset({
     # A lightweight heuristic list to detect Indonesian output.
     "yang",
     "untuk",
@@ -63,7 +90,7 @@ _ID_STOPWORDS = {
     "karena",
     "kalau",
     "banget",
-}
+})
 
 
 _LANGUAGE_NAME = {
@@ -84,6 +111,13 @@ _LANGUAGE_NAME = {
 }
 
 
+_LANG_CODE_RE = re.compile(r"^[a-z]{2,3}$")
+_WORD_RE = re.compile(r"[A-Za-z]+")
+_WS_RE = re.compile(r"\s+")
+_UNDERSCORE_TO_DASH = str.maketrans("_", "-")
+
+
+@lru_cache(maxsize=256)
 def _normalize_language(lang: Optional[str]) -> str:
     """Normalize BCP-47/locale strings to a primary language code.
 
@@ -93,16 +127,19 @@ def _normalize_language(lang: Optional[str]) -> str:
     if not lang:
         return "en"
 
-    raw = str(lang).strip().lower().replace("_", "-")
+    raw = (lang if isinstance(lang, str) else str(lang)).strip()
     if not raw:
         return "en"
 
-    primary = raw.split("-")[0]
-    if not re.match(r"^[a-z]{2,3}$", primary):
+    # Only the primary subtag matters, so fold '_' into '-' with one C-level
+    # scan and lowercase just that prefix.
+    primary = raw.translate(_UNDERSCORE_TO_DASH).split("-", 1)[0].lower()
+    if not _LANG_CODE_RE.match(primary):
         return "en"
     return primary
 
 
+@lru_cache(maxsize=256)
 def _language_label(lang: Optional[str]) -> str:
     code = _normalize_language(lang)
     return _LANGUAGE_NAME.get(code, code)
@@ -129,7 +166,7 @@ def _coerce_insights_bullets(value: Any) -> str:
     # If the model returned something list-like as a string, try to recover.
     if text.startswith("[") and text.endswith("]"):
         try:
-            decoded = json.loads(text)
+            decoded = _json_loads(text)
             if isinstance(decoded, list):
                 items = [str(v).strip() for v in decoded if str(v).strip()]
                 return "\n".join([f"- {i.lstrip('-').strip()}" for i in items])
@@ -153,17 +190,102 @@ def _coerce_insights_bullets(value: Any) -> str:
     return "\n".join(normalized)
 
 
+_JSON_STRUCT_RE = re.compile(r'[{}"\\]')
+
+
+def _extract_json_obj(text: str) -> str:
+    """Return the first balanced {...} object in `text`, or `text` unchanged.
+
+    Jumps between structural characters with a regex (tracking string and
+    escape state) and stops at the closing brace, so trailing prose or a
+    second object after the JSON doesn't end up in the slice.
+    """
+
+    start = text.find("{")
+    if start == -1:
+        return text
+
+    search = _JSON_STRUCT_RE.search
+    depth = 0
+    in_string = False
+    pos = start
+    while True:
+        m = search(text, pos)
+        if m is None:
+            return text
+        ch = m.group()
+        pos = m.end()
+        if in_string:
+            if ch == "\\":
+                pos += 1
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                return text[start:pos]
+
+
+def _parse_json_reply(text: Optional[str]) -> Any:
+    """Parse a JSON-mode reply; fall back to brace extraction for stray prose."""
+
+    raw = (text or "").strip()
+    try:
+        return _json_loads(raw)
+    except ValueError:
+        return _json_loads(_extract_json_obj(raw))
+
+
+def _is_blank(text: Optional[str]) -> bool:
+    """Empty/whitespace-only check without building a stripped copy."""
+
+    return not text or text.isspace()
+
+
+def _clean_str(value: Any) -> str:
+    """Stripped text for a model/request field; falsy values become ""."""
+
+    if not value:
+        return ""
+    return (value if isinstance(value, str) else str(value)).strip()
+
+
+def _clean_opt(value: Any) -> Optional[str]:
+    """Like _clean_str, but blank results become None."""
+
+    return _clean_str(value) or None
+
+
+def _clean_int(value: Any, default: int, lo: int, hi: int) -> int:
+    """Round a numeric field and clamp it to [lo, hi]; non-numbers use `default`."""
+
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return default
+    return max(lo, min(hi, int(round(value))))
+
+
 def _looks_indonesian(text: str) -> bool:
     if not text:
         return False
-    # Keep only letters/spaces for tokenization.
-    cleaned = re.sub(r"[^A-Za-z\s]", " ", text).lower()
-    tokens = [t for t in cleaned.split() if t]
-    if not tokens:
-        return False
-    hits = sum(1 for t in tokens if t in _ID_STOPWORDS)
-    # Require multiple hits to reduce false positives.
-    return hits >= 2 or (hits >= 1 and (hits / max(1, len(tokens))) >= 0.20)
+    # Tokens are runs of ASCII letters; scan once without building copies.
+    stopwords = _ID_STOPWORDS
+    lower = str.lower
+    hits = 0
+    total = 0
+    for m in _WORD_RE.finditer(text):
+        total += 1
+        if lower(m.group()) in stopwords:
+            hits += 1
+            # Require multiple hits to reduce false positives.
+            if hits >= 2:
+                return True
+    # Past the loop hits is 0 or 1, so the 20% ratio test reduces to a
+    # single stopword among at most five tokens.
+    return hits == 1 and total <= 5
 
 load_dotenv()
 
@@ -223,23 +345,81 @@ if OPIK_AVAILABLE:
 else:
     logger.warning("⚠ Opik SDK not available. Continuing without observability.")
 
-app = FastAPI(title="FlexiFit Backend", version="1.0.0")
+if not OPIK_ENABLED:
+    # An unconfigured SDK would still wrap every call (and try to log);
+    # leave the hot functions undecorated instead.
+    track = _noop_track
 
+# Read after the Opik setup above, which may default it via setdefault().
+OPIK_PROJECT_NAME = os.getenv("OPIK_PROJECT_NAME", "flexifit-hackathon")
 
-@app.middleware("http")
-async def _opik_flush_middleware(request: Request, call_next):
-    response = await call_next(request)
-    if OPIK_ENABLED and OPIK_AVAILABLE:
-        try:
-            import opik as _opik
+app = FastAPI(
+    title="FlexiFit Backend",
+    version="1.0.0",
+    default_response_class=_DEFAULT_RESPONSE_CLASS,
+)
+
+
+OPIK_FLUSH_INTERVAL_S = float(os.getenv("OPIK_FLUSH_INTERVAL_S", "5"))
 
-            flush_fn = getattr(_opik, "flush", None)
-            if callable(flush_fn):
-                flush_fn()
+
+def _resolve_opik_flush():
+    if not (OPIK_ENABLED and OPIK_AVAILABLE):
+        return None
+    try:
+        import opik as _opik
+    except Exception:
+        return None
+    # Older SDKs expose flush(); newer ones flush_tracker().
+    for name in ("flush", "flush_tracker"):
+        flush_fn = getattr(_opik, name, None)
+        if callable(flush_fn):
+            return flush_fn
+    return None
+
+
+async def _periodic_opik_flush(flush_fn) -> None:
+    """Flush Opik traces on a timer instead of at the tail of every request."""
+    while True:
+        await asyncio.sleep(OPIK_FLUSH_INTERVAL_S)
+        try:
+            await asyncio.to_thread(flush_fn)
         except Exception:
-            # Never fail requests due to observability.
+            # Never let observability take the worker down.
             pass
-    return response
+
+
+def _warm_opik_client() -> None:
+    # @track builds its client lazily on the first trace; doing it here keeps
+    # the client construction (HTTP session, config read) off the first /chat.
+    try:
+        from opik.api_objects import opik_client
+
+        opik_client.get_client_cached()
+    except Exception as e:
+        logger.warning(f"⚠ Opik client warmup skipped: {e!r}")
+
+
+@app.on_event("startup")
+async def _start_opik_flush() -> None:
+    if OPIK_ENABLED and OPIK_AVAILABLE:
+        await asyncio.to_thread(_warm_opik_client)
+    flush_fn = _resolve_opik_flush()
+    if flush_fn is not None:
+        app.state.opik_flush_fn = flush_fn
+        app.state.opik_flush_task = asyncio.create_task(_periodic_opik_flush(flush_fn))
+
+
+@app.on_event("shutdown")
+async def _stop_opik_flush() -> None:
+    task = getattr(app.state, "opik_flush_task", None)
+    if task is None:
+        return
+    task.cancel()
+    try:
+        await asyncio.to_thread(app.state.opik_flush_fn)
+    except Exception:
+        pass
 
 # CORS Configuration: Tighten in production
 
@@ -298,25 +478,49 @@ FEW-SHOT EXAMPLES:
 """
 
 
-def _select_gemini_model() -> str:
+# Model discovery costs Gemini RPCs on every worker start; remember the result.
+_MODEL_CACHE_PATH = os.getenv("GEMINI_MODEL_CACHE_PATH") or os.path.join(
+    os.path.expanduser("~"), ".cache", "flexifit", "gemini_model.json"
+)
+# Model availability changes rarely; a day keeps worker restarts/reloads off
+# the discovery path.
+_MODEL_CACHE_TTL_S = float(os.getenv("GEMINI_MODEL_CACHE_TTL_S", "86400"))
+# Per-call cap for the discovery probes so a slow API can't stall import.
+_MODEL_DISCOVERY_TIMEOUT_S = 2
 
-    requested = (os.getenv("GEMINI_MODEL") or "").strip()
-    if requested.startswith("models/"):
-        requested = requested[len("models/") :]
 
-    preferred_candidates = [
-        "gemini-3-flash-preview",    
-        "gemini-2.5-flash",            # Stable, best price-performance
-        "gemini-2.5-flash-lite",      
-    ]
+def _read_model_cache(requested: str) -> Optional[str]:
+    try:
+        with open(_MODEL_CACHE_PATH, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+        if cached.get("requested") != requested:
+            return None
+        if time.time() - float(cached.get("ts", 0)) >= _MODEL_CACHE_TTL_S:
+            return None
+        return cached.get("model") or None
+    except Exception:
+        return None
 
-    if requested:
-        preferred_candidates.insert(0, requested)
 
+def _write_model_cache(requested: str, selected: str) -> None:
+    try:
+        os.makedirs(os.path.dirname(_MODEL_CACHE_PATH), exist_ok=True)
+        tmp_path = f"{_MODEL_CACHE_PATH}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"ts": time.time(), "requested": requested, "model": selected}, f)
+        os.replace(tmp_path, _MODEL_CACHE_PATH)
+    except Exception as e:
+        logger.warning(f"Could not write Gemini model cache: {e}")
+
+
+def _discover_gemini_model(preferred_candidates: List[str]) -> Optional[str]:
     if hasattr(genai, "get_model"):
         for cand in preferred_candidates:
             try:
-                genai.get_model(f"models/{cand}")
+                genai.get_model(
+                    f"models/{cand}",
+                    request_options={"timeout": _MODEL_DISCOVERY_TIMEOUT_S},
+                )
                 logger.info(f"✓ Selected Gemini model: {cand}")
                 return cand
             except Exception as e:
@@ -325,7 +529,7 @@ def _select_gemini_model() -> str:
 
     try:
         available: List[str] = []
-        for m in genai.list_models():
+        for m in genai.list_models(request_options={"timeout": _MODEL_DISCOVERY_TIMEOUT_S}):
             name = getattr(m, "name", "") or ""
             methods = getattr(m, "supported_generation_methods", []) or []
             if "generateContent" not in methods:
@@ -345,7 +549,36 @@ def _select_gemini_model() -> str:
     except Exception as e:
         logger.warning(f"Could not list Gemini models: {e}")
 
-    return "gemini-2.5-flash"
+    return None
+
+
+def _select_gemini_model() -> str:
+
+    requested = (os.getenv("GEMINI_MODEL") or "").strip()
+    if requested.startswith("models/"):
+        requested = requested[len("models/") :]
+
+    cached = _read_model_cache(requested)
+    if cached:
+        logger.info(f"✓ Selected Gemini model (cached): {cached}")
+        return cached
+
+    preferred_candidates = [
+        "gemini-3-flash-preview",    
+        "gemini-2.5-flash",            # Stable, best price-performance
+        "gemini-2.5-flash-lite",      
+    ]
+
+    if requested:
+        preferred_candidates.insert(0, requested)
+
+    selected = _discover_gemini_model(preferred_candidates)
+    if not selected:
+        # Discovery failed (network/auth); don't cache the blind fallback.
+        return "gemini-2.5-flash"
+
+    _write_model_cache(requested, selected)
+    return selected
 
 
 GEMINI_MODEL = _select_gemini_model()
@@ -353,22 +586,236 @@ PROMPT_VERSION = (os.getenv("PROMPT_VERSION") or "v1").strip() or "v1"
 model = genai.GenerativeModel(model_name=GEMINI_MODEL, system_instruction=SYSTEM_INSTRUCTION)
 logger.info(f"Using Gemini model: {GEMINI_MODEL}")
 
+# The SDK already reuses one HTTP/2 gRPC channel per process; these options
+# keep that connection warm across idle gaps so bursts after a quiet period
+# don't pay a fresh TCP+TLS handshake (Railway's proxy drops idle sockets).
+_GEMINI_CHANNEL_OPTIONS = (
+    ("grpc.keepalive_time_ms", 30_000),
+    ("grpc.keepalive_timeout_ms", 10_000),
+    ("grpc.keepalive_permit_without_calls", 1),
+    ("grpc.http2.max_pings_without_data", 0),
+)
+
+
+def _keepalive_channel(host, **kwargs):
+    kwargs["options"] = [*kwargs.get("options", ()), *_GEMINI_CHANNEL_OPTIONS]
+    return GenerativeServiceGrpcAsyncIOTransport.create_channel(host, **kwargs)
+
+
+@app.on_event("startup")
+async def _install_gemini_async_client() -> None:
+    # grpc.aio channels bind to the running loop, so build it here rather than
+    # at import time.
+    try:
+        model._async_client = glm.GenerativeServiceAsyncClient(
+            transport=partial(GenerativeServiceGrpcAsyncIOTransport, channel=_keepalive_channel),
+            client_options={"api_key": GOOGLE_API_KEY},
+        )
+    except Exception as e:
+        logger.warning(f"⚠ Using default Gemini async client: {e}")
 
-def _generate_with_retry(prompt, *, request_options=None, max_retries=3):
-    """Wrap model.generate_content with exponential back-off for 429 errors."""
+
+GEMINI_WARMUP = str(os.getenv("GEMINI_WARMUP", "true")).strip().lower() in {"1", "true", "yes", "on"}
+
+
+@app.on_event("startup")
+async def _warm_gemini_channel() -> None:
+    """Open the gRPC channel and exchange credentials before the first request.
+
+    count_tokens rides the same async client and channel as generation but
+    is not billed, so it warms the connection without spending tokens.
+    """
+    if not GEMINI_WARMUP:
+        return
+    started = time.perf_counter()
+    try:
+        # Hard cap: the gRPC layer retries DNS/connect failures on its own.
+        await asyncio.wait_for(
+            model.count_tokens_async("ping", request_options={"timeout": 5}),
+            timeout=5,
+        )
+        logger.info(f"✓ Gemini channel warmed in {(time.perf_counter() - started) * 1000:.0f}ms")
+    except Exception as e:
+        logger.warning(f"⚠ Gemini warmup skipped: {e!r}")
+
+
+class GeminiDispatcher:
+    """Process-wide gate for Gemini calls.
+
+    Every endpoint funnels through one semaphore so bursts of concurrent
+    requests queue here instead of fanning out into upstream 429s.
+    """
+
+    def __init__(self, max_concurrency: int):
+        self.max_concurrency = max(1, max_concurrency)
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.in_flight = 0
+        # Recent queueing delays (seconds) for tuning GEMINI_MAX_CONCURRENCY.
+        self._waits: deque = deque(maxlen=1024)
+        # Set at startup when the system instruction is served from a
+        # Gemini context cache; falls back to the plain model otherwise.
+        self.cached_model = None
+
+    async def generate(self, prompt, request_options, generation_config=None, target_model=None):
+        queued_at = time.perf_counter()
+        async with self._semaphore:
+            self._waits.append(time.perf_counter() - queued_at)
+            self.in_flight += 1
+            try:
+                return await (target_model or self.cached_model or model).generate_content_async(
+                    prompt,
+                    generation_config=generation_config,
+                    request_options=request_options,
+                )
+            finally:
+                self.in_flight -= 1
+
+    def wait_stats(self) -> dict:
+        """p50/p99 time spent waiting for a slot, in milliseconds."""
+        waits = sorted(self._waits)
+        if not waits:
+            return {"in_flight": self.in_flight, "samples": 0, "wait_p50_ms": None, "wait_p99_ms": None}
+        return {
+            "in_flight": self.in_flight,
+            "samples": len(waits),
+            "wait_p50_ms": round(waits[len(waits) // 2] * 1000, 1),
+            "wait_p99_ms": round(waits[min(len(waits) - 1, int(len(waits) * 0.99))] * 1000, 1),
+        }
+
+
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "32"))
+gemini_dispatcher = GeminiDispatcher(GEMINI_MAX_CONCURRENCY)
+
+
+GEMINI_CONTEXT_CACHE = str(os.getenv("GEMINI_CONTEXT_CACHE", "false")).strip().lower() in {"1", "true", "yes", "on"}
+GEMINI_CONTEXT_CACHE_TTL_S = int(os.getenv("GEMINI_CONTEXT_CACHE_TTL_S", "3600"))
+
+
+async def _refresh_context_cache(cached_content) -> None:
+    """Push the cache expiry forward well before it lapses."""
+    while True:
+        await asyncio.sleep(GEMINI_CONTEXT_CACHE_TTL_S / 2)
+        try:
+            await asyncio.to_thread(cached_content.update, ttl=GEMINI_CONTEXT_CACHE_TTL_S)
+        except Exception as e:
+            logger.warning(f"⚠ Gemini context cache refresh failed: {e!r}")
+
+
+@app.on_event("startup")
+async def _start_context_cache() -> None:
+    """Upload SYSTEM_INSTRUCTION once and reference it by handle.
+
+    Gemini rejects caches below a per-model minimum token count, so this is
+    opt-in and any failure leaves the plain model in place.
+    """
+    if not GEMINI_CONTEXT_CACHE:
+        return
+    try:
+        cached_content = await asyncio.to_thread(
+            genai.caching.CachedContent.create,
+            model=f"models/{GEMINI_MODEL}",
+            display_name=f"flexifit-system-{PROMPT_VERSION}",
+            system_instruction=SYSTEM_INSTRUCTION,
+            ttl=GEMINI_CONTEXT_CACHE_TTL_S,
+        )
+        cached_model = genai.GenerativeModel.from_cached_content(cached_content)
+    except Exception as e:
+        logger.warning(f"⚠ Gemini context cache disabled: {e!r}")
+        return
+    # Reuse the keepalive channel installed above.
+    cached_model._async_client = model._async_client
+    gemini_dispatcher.cached_model = cached_model
+    app.state.gemini_context_cache = cached_content
+    app.state.gemini_context_cache_task = asyncio.create_task(_refresh_context_cache(cached_content))
+    logger.info(f"✓ Gemini context cache ready: {cached_content.name}")
+
+
+@app.on_event("shutdown")
+async def _stop_context_cache() -> None:
+    cached_content = getattr(app.state, "gemini_context_cache", None)
+    if cached_content is None:
+        return
+    app.state.gemini_context_cache_task.cancel()
+    gemini_dispatcher.cached_model = None
+    try:
+        await asyncio.to_thread(cached_content.delete)
+    except Exception:
+        pass
+
+
+_BACKOFF_MAX_S = 8
+
+
+async def _generate_with_retry(
+    prompt,
+    *,
+    request_options=None,
+    generation_config=None,
+    target_model=None,
+    max_retries=3,
+):
+    """Wrap model.generate_content_async with exponential back-off.
+
+    Only transient capacity errors (429 ResourceExhausted, 503
+    ServiceUnavailable) are retried; everything else surfaces immediately.
+    """
     opts = request_options or {"timeout": 26}
     for attempt in range(max_retries + 1):
         try:
-            response = model.generate_content(prompt, request_options=opts)
+            # The slot is released before any back-off sleep below.
+            response = await gemini_dispatcher.generate(prompt, opts, generation_config, target_model)
             return response
-        except ResourceExhausted as e:
+        except (ResourceExhausted, ServiceUnavailable) as e:
+            code = 429 if isinstance(e, ResourceExhausted) else 503
             if attempt < max_retries:
-                wait = 2 ** attempt 
-                logger.warning(f"Rate limited (429), retrying in {wait}s (attempt {attempt + 1}/{max_retries})")
-                time.sleep(wait)
+                # Jitter keeps concurrent requests from retrying in lockstep.
+                wait = min(_BACKOFF_MAX_S, 2 ** attempt) + random.uniform(0, 0.5)
+                logger.warning(f"Gemini busy ({code}), retrying in {wait:.1f}s (attempt {attempt + 1}/{max_retries})")
+                await asyncio.sleep(wait)
             else:
-                logger.error("Rate limited (429) after all retries")
+                logger.error(f"Gemini busy ({code}) after all retries")
+                raise
+
+
+async def _generate_json(
+    prompt,
+    *,
+    request_options=None,
+    generation_config=None,
+    target_model=None,
+    parse_attempts=2,
+) -> Any:
+    """Generate and parse a JSON reply.
+
+    Malformed output is a sampling fluke rather than back-pressure, so it is
+    re-asked immediately (no back-off) before giving up.
+    """
+    for attempt in range(parse_attempts):
+        response = await _generate_with_retry(
+            prompt,
+            request_options=request_options,
+            generation_config=generation_config,
+            target_model=target_model,
+        )
+        try:
+            return _parse_json_reply(response.text)
+        except ValueError:
+            if attempt + 1 >= parse_attempts:
                 raise
+            logger.warning("Malformed JSON from Gemini, asking again")
+
+
+# Requests carrying more history than this are rejected with 413; prompts
+# only ever use the last few turns.
+CHAT_HISTORY_MAX_ITEMS = int(os.getenv("CHAT_HISTORY_MAX_ITEMS", "200"))
+
+
+def _check_history_size(history: List["ChatMessage"]) -> None:
+    if len(history) > CHAT_HISTORY_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"chat_history too long (max {CHAT_HISTORY_MAX_ITEMS} messages)",
+        )
 
 
 class ChatMessage(BaseModel):
@@ -391,6 +838,153 @@ class ChatResponse(BaseModel):
     retry_used: Optional[bool] = None
     initial_empathy_score: Optional[float] = None
 
+class ChatBatchRequest(BaseModel):
+    cases: List[ChatRequest]
+
+class ChatBatchResult(ChatResponse):
+    # A failed case carries its error instead of failing the whole batch.
+    response: Optional[str] = None
+    status_code: int = 200
+    error: Optional[str] = None
+
+class ChatBatchResponse(BaseModel):
+    results: List[ChatBatchResult]
+
+
+# Upper bound on cases per /chat/batch call to keep Gemini fan-out predictable.
+CHAT_BATCH_MAX_CASES = 16
+
+
+_MODEL_ROLES = frozenset({"model", "assistant", "ai", "bot"})
+_USER_ROLES = frozenset({"user", "human"})
+# Roles that can post the "new journey started" reset marker.
+_JOURNEY_MARKER_ROLES = frozenset({"model", "assistant", "bot"})
+
+
+_SPEAKER_BY_ROLE = {
+    **{role: "FLEXIFIT" for role in _MODEL_ROLES},
+    **{role: "USER" for role in _USER_ROLES},
+}
+
+# Rough prompt budget for chat history (~4 chars per token). The newest lines
+# are kept; older ones drop off once a transcript would exceed it.
+TRANSCRIPT_MAX_CHARS = 6000
+# A single pasted wall of text shouldn't crowd out the rest of the history.
+TRANSCRIPT_MSG_MAX_CHARS = 400
+# Back-to-back coach messages beyond this add tokens but no new user signal.
+_MAX_CONSECUTIVE_COACH_TURNS = 2
+
+
+def _clip(text: str, limit: int = TRANSCRIPT_MSG_MAX_CHARS) -> str:
+    return text if len(text) <= limit else text[: limit - 1] + "…"
+
+
+def _history_to_transcript(
+    items: List[ChatMessage],
+    limit: int = 12,
+    max_chars: int = TRANSCRIPT_MAX_CHARS,
+) -> str:
+    """Render recent messages as FLEXIFIT/USER lines for the negotiator.
+
+    Keeps at most the last `limit` messages, each clipped, and collapses runs
+    of coach messages. When the character budget drops user turns from the
+    current journey, a one-line "[Earlier: ...]" note stands in for them.
+    """
+
+    strip = str.strip
+    speaker_for = _SPEAKER_BY_ROLE.get
+    lines: List[str] = []
+    append = lines.append
+    used = 0
+    coach_run = 0
+    dropped_from = None
+    window_start = max(0, len(items) - limit)
+    # Walk newest-first so the character budget trims the oldest turns.
+    for idx in range(len(items) - 1, window_start - 1, -1):
+        msg = items[idx]
+        text = strip(msg.text or "")
+        if not text:
+            continue
+        speaker = speaker_for(strip(msg.role or "").lower())
+        if speaker is None:
+            continue
+
+        if speaker == "FLEXIFIT":
+            coach_run += 1
+            if coach_run > _MAX_CONSECUTIVE_COACH_TURNS:
+                continue
+        else:
+            coach_run = 0
+
+        line = f"{speaker}: {_clip(text)}"
+        used += len(line) + 1
+        if used > max_chars and lines:
+            dropped_from = idx
+            break
+        append(line)
+
+    if dropped_from is not None:
+        # Only the budget-dropped part of the window, back to the latest
+        # journey marker; turns before the window were never in scope.
+        dropped_user_turns = 0
+        for idx in range(dropped_from, window_start - 1, -1):
+            msg = items[idx]
+            role = strip(msg.role or "").lower()
+            if role in _USER_ROLES:
+                dropped_user_turns += 1
+            elif role in _JOURNEY_MARKER_ROLES and "new journey started" in (msg.text or "").lower():
+                break
+        if dropped_user_turns:
+            append(f"[Earlier: {dropped_user_turns} older user messages omitted]")
+    lines.reverse()
+    return "\n".join(lines)
+
+
+def _history_to_raw_transcript(
+    items: List[ChatMessage],
+    limit: int = 20,
+    max_chars: int = TRANSCRIPT_MAX_CHARS,
+) -> str:
+    """Render the last `limit` messages verbatim as ROLE: text lines."""
+
+    lines: List[str] = []
+    append = lines.append
+    used = 0
+    for m in reversed(items[-limit:]):
+        line = f"{m.role.upper()}: {_clip(m.text)}"
+        used += len(line) + 1
+        if used > max_chars and lines:
+            break
+        append(line)
+    lines.reverse()
+    return "\n".join(lines)
+
+
+# Deals are only offered once the user has spoken this many times.
+_DEAL_MIN_USER_TURNS = 4
+
+
+def _count_user_turns(items: List[ChatMessage], cap: int, since_journey: bool = False) -> int:
+    """Count user messages newest-first, stopping once `cap` is reached.
+
+    With `since_journey`, counting also stops at the latest "new journey
+    started" marker. Callers only compare against a small threshold, so long
+    histories are not walked end to end.
+    """
+
+    strip = str.strip
+    lower = str.lower
+    count = 0
+    for m in reversed(items):
+        role = lower(strip(m.role or ""))
+        if role in _USER_ROLES:
+            count += 1
+            if count >= cap:
+                break
+        elif since_journey and role in _JOURNEY_MARKER_ROLES and "new journey started" in lower(m.text or ""):
+            break
+    return count
+
 
 _DEAL_TAG_RE = re.compile(r"<DEAL>(.*?)</DEAL>", re.IGNORECASE | re.DOTALL)
 
@@ -406,12 +1000,14 @@ def _extract_deal_meta(text: str) -> tuple[str, Optional[str]]:
     if not raw:
         return "", None
 
-    match = _DEAL_TAG_RE.search(raw)
-    if not match:
+    # One traversal: the callback records each tag's label while subn strips it.
+    labels: List[str] = []
+    cleaned, n = _DEAL_TAG_RE.subn(lambda m: labels.append(m.group(1) or "") or "", raw)
+    if not n:
         return raw, None
 
-    label = (match.group(1) or "").strip()
-    cleaned = _DEAL_TAG_RE.sub("", raw).strip()
+    label = labels[0].strip()
+    cleaned = cleaned.strip()
     # Clean up any leftover blank lines introduced by stripping.
     cleaned = "\n".join([l.rstrip() for l in cleaned.splitlines() if l.strip()]).strip()
 
@@ -471,6 +1067,168 @@ class PersonaResponse(BaseModel):
     status: str
     data: PersonaData
 
+# Prompt templates are built once; request handlers only substitute fields.
+_NEG_DEAL_RULES = (
+    "DEAL RULES (VERY IMPORTANT):\n"
+    "- You MAY empathise and propose tiny starter steps in early replies, but do NOT emit a <DEAL> tag yet.\n"
+    "- Only emit <DEAL> when ALL of these are true:\n"
+    "  1. At least 4 prior user messages exist in the chat history (not counting the current one).\n"
+    "  2. The user has AGREED or shown willingness to do the proposed action.\n"
+    "  3. The proposed action represents MEANINGFUL effort — roughly 55 % or more of the main goal.\n"
+    "     - If the goal contains a clear quantity + unit (e.g., 'Run 2 km', 'Read 40 pages'), then the deal MUST also include a quantity + the SAME unit, and it MUST be >= 55% of the goal.\n"
+    "     - NEVER emit a deal for tiny starter steps (e.g., 'put on your shoes', 'read two pages' for a 40-page goal).\n"
+    "     Examples: goal 'Run 2 km' -> deal 'Run 1 km' or 'Walk/jog 1.5 km'. Goal 'Read 40 pages' -> deal 'Read 22 pages'. Goal 'Sleep 5 hours' -> deal 'Sleep 3 hours'. NEVER 'lay down for 10 minutes' for a 5-hour sleep goal.\n"
+    "- Format: append ONE final line exactly as <DEAL>meaningful action</DEAL>. This line is metadata.\n\n"
+)
+_NEG_EARLY_STATUS_TMPL = (
+    "CURRENT STATUS: Conversation just started (only {n} prior user messages). "
+    "Do NOT emit <DEAL> yet. Focus on empathy and understanding the user's situation.\n\n"
+)
+# Ordered most-stable first so Gemini's implicit prefix cache can reuse the
+# prefill: fixed rules, then the goal (fixed per conversation), then history
+# (append-only), and only then the per-turn status and message.
+_NEG_PROMPT_TMPL = (
+    "You are FlexiFit. Follow the NEGOTIATION LOOP strictly.\n"
+    "Return 2-3 short sentences max.\n\n"
+    + _NEG_DEAL_RULES
+    + "GOAL: {goal}\n\n"
+    "CHAT_HISTORY:\n{transcript}\n\n"
+    "{deal_status}"
+    "NEW_MESSAGE (USER): {user_msg}\n"
+)
+
+_NEG_RETRY_DEAL_CLAUSE = (
+    "If you propose a specific micro-habit for today that represents meaningful effort "
+    "(at least ~55%% of the main goal — NOT  a trivial starter step), "
+    "AND at least 4 prior user messages exist, "
+    "AND if the goal has a clear quantity+unit then the deal MUST match the unit and be >=55%%, "
+    "append ONE final line exactly as <DEAL>meaningful action</DEAL>. "
+    "This line is metadata and does not count as a sentence.\n"
+)
+_NEG_RETRY_NO_DEAL_CLAUSE = "Do NOT emit a <DEAL> tag — conversation is too short.\n"
+_NEG_RETRY_PROMPT_TMPL = (
+    "You are FlexiFit. Your previous reply was judged as not empathetic enough. "
+    "Rewrite it to be more validating and more micro-habit-focused, while staying concise.\n"
+    "Constraints:\n"
+    "- 2-3 short sentences max\n"
+    "- Validate feelings first\n"
+    "- Propose ONE tiny, doable micro-habit\n"
+    "- No judgement, no lecturing\n\n"
+    "GOAL: {goal}\n\n"
+    "CHAT_HISTORY:\n{transcript}\n\n"
+    "{deal_clause}\n"
+    "NEW_MESSAGE (USER): {user_msg}\n\n"
+    "PREVIOUS_REPLY: {previous_reply}\n"
+    "JUDGE_SCORE: {judge_score}/5\n"
+    "JUDGE_RATIONALE: {judge_rationale}\n"
+)
+
+_JUDGE_RUBRIC = (
+    "Scoring (1-5):\n"
+    "- 5: Clearly validates feelings + proposes an ultra-small, doable micro-habit + supportive tone.\n"
+    "- 4: Validates feelings + proposes a realistic micro-habit, minor wording issues.\n"
+    "- 3: Some empathy OR some micro-habit, but not both strongly.\n"
+    "- 2: Weak empathy and vague/too-big action step.\n"
+    "- 1: No empathy, dismissive, or no actionable micro-habit.\n\n"
+)
+_JUDGE_PROMPT_TMPL = (
+    "You are an evaluator for a habit-coaching AI. "
+    "Score the AI reply for EMPATHY + MICRO-HABIT behavior. "
+    "Return STRICT JSON only (no markdown).\n"
+    "Schema: {{\"empathy\": 1|2|3|4|5, \"rationale\": \"...\"}}.\n"
+    + _JUDGE_RUBRIC
+    + "USER: {user_text}\n"
+    "AI: {ai_text}\n"
+)
+_JUDGE_BATCH_PROMPT_TMPL = (
+    "You are an evaluator for a habit-coaching AI. "
+    "Score EACH numbered exchange below independently for EMPATHY + MICRO-HABIT behavior. "
+    "Return STRICT JSON only (no markdown).\n"
+    "Schema: [{{\"index\": integer, \"empathy\": 1|2|3|4|5, \"rationale\": \"...\"}}], "
+    "exactly one object per exchange.\n"
+    + _JUDGE_RUBRIC
+    + "{exchanges}"
+)
+
+_JUDGE_GENERATION_CONFIG = {
+    "response_mime_type": "application/json",
+    "response_schema": {
+        "type": "object",
+        "properties": {
+            "empathy": {"type": "integer"},
+            "rationale": {"type": "string"},
+        },
+        "required": ["empathy", "rationale"],
+    },
+}
+
+
+# Negotiator replies can be cached on the model, prompt version and exact
+# rendered prompt. Off by default so eval runs and prompt changes always hit
+# the model; the semantic tier also costs an embedding call per miss.
+LLM_CACHE_TTL_S = float(os.getenv("LLM_CACHE_TTL_S", "0"))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024"))
+LLM_CACHE_SEMANTIC = str(os.getenv("LLM_CACHE_SEMANTIC", "false")).strip().lower() in {"1", "true", "yes", "on"}
+LLM_CACHE_SIMILARITY = float(os.getenv("LLM_CACHE_SIMILARITY", "0.92"))
+GEMINI_EMBED_MODEL = (os.getenv("GEMINI_EMBED_MODEL") or "models/text-embedding-004").strip()
+
+
+async def _embed_for_cache(text: str) -> List[float]:
+    result = await genai.embed_content_async(
+        model=GEMINI_EMBED_MODEL,
+        content=text,
+        task_type="semantic_similarity",
+        request_options={"timeout": 5},
+    )
+    return result["embedding"]
+
+
+negotiator_cache = LLMCache(
+    namespace="flexifit:negotiator",
+    ttl_s=LLM_CACHE_TTL_S,
+    max_entries=LLM_CACHE_MAX_ENTRIES,
+    embed_fn=_embed_for_cache if LLM_CACHE_SEMANTIC else None,
+    similarity_threshold=LLM_CACHE_SIMILARITY,
+    redis_url=os.getenv("REDIS_URL"),
+)
+
+_JUDGE_BATCH_GENERATION_CONFIG = {
+    "response_mime_type": "application/json",
+    "response_schema": {
+        "type": "array",
+        "items": {
+            "type": "object",
+            "properties": {
+                "index": {"type": "integer"},
+                "empathy": {"type": "integer"},
+                "rationale": {"type": "string"},
+            },
+            "required": ["index", "empathy", "rationale"],
+        },
+    },
+}
+
+# Concurrent /chat requests' judge calls are coalesced for this long into a
+# single Gemini call. Opt-in: the default of 0 disables batching, and
+# JUDGE_BATCH_MAX only applies once a window is set.
+JUDGE_BATCH_WINDOW_MS = float(os.getenv("JUDGE_BATCH_WINDOW_MS", "0"))
+JUDGE_BATCH_MAX = int(os.getenv("JUDGE_BATCH_MAX", "8"))
+
+# Self-correction loop settings are fixed for the life of the process.
+RETRY_ON_LOW_EMPATHY = str(os.getenv("RETRY_ON_LOW_EMPATHY", "false")).strip().lower() in {
+    "1",
+    "true",
+    "yes",
+    "on",
+}
+try:
+    RETRY_EMPATHY_THRESHOLD = max(1, min(5, int(os.getenv("RETRY_EMPATHY_THRESHOLD", "3"))))
+except ValueError:
+    logger.warning("⚠ RETRY_EMPATHY_THRESHOLD is not an integer; using 3.")
+    RETRY_EMPATHY_THRESHOLD = 3
+
+NEGOTIATOR_TIMEOUT_S = float(os.getenv("NEGOTIATOR_TIMEOUT_S", "30"))
+
 # AI wrapper function with enhanced Opik tracking
 @track(
     name="flexifit_negotiation",
@@ -482,86 +1240,55 @@ class PersonaResponse(BaseModel):
         "feature": "negotiator-loop"
     }
 )
-def call_gemini_negotiator(user_msg: str, goal: str, history: List[ChatMessage]):
+async def call_gemini_negotiator(user_msg: str, goal: str, history: List[ChatMessage]):
     """
     Core negotiation engine: 
     - Receives user message + goal context
     - Returns empathetic, adaptive micro-habit proposal
     - Opik automatically logs input/output + tracing
     """
-    def _history_to_transcript(items: List[ChatMessage]) -> str:
-        lines: List[str] = []
-        for msg in items[-12:]:
-            role = (msg.role or "").strip().lower()
-            text = (msg.text or "").strip()
-            if not text:
-                continue
-
-            if role in {"model", "assistant", "ai", "bot"}:
-                speaker = "FLEXIFIT"
-            elif role in {"user", "human"}:
-                speaker = "USER"
-            else:
-                continue
-
-            lines.append(f"{speaker}: {text}")
-        return "\n".join(lines)
-
     try:
         transcript = _history_to_transcript(history)
-
-        journey_start_idx = 0
-        for i, m in enumerate(history):
-            role = (m.role or "").strip().lower()
-            text = (m.text or "").lower()
-            if role in {"model", "assistant", "bot"} and "new journey started" in text:
-                journey_start_idx = i + 1
-
-        user_msg_count = sum(
-            1 for m in history[journey_start_idx:]
-            if (m.role or "").strip().lower() in {"user", "human"}
-        )
-
-        deal_instruction = (
-            "DEAL RULES (VERY IMPORTANT):\n"
-            "- You MAY empathise and propose tiny starter steps in early replies, but do NOT emit a <DEAL> tag yet.\n"
-            "- Only emit <DEAL> when ALL of these are true:\n"
-            "  1. At least 4 prior user messages exist in the chat history (not counting the current one).\n"
-            "  2. The user has AGREED or shown willingness to do the proposed action.\n"
-            "  3. The proposed action represents MEANINGFUL effort — roughly 55 % or more of the main goal.\n"
-            "     - If the goal contains a clear quantity + unit (e.g., 'Run 2 km', 'Read 40 pages'), then the deal MUST also include a quantity + the SAME unit, and it MUST be >= 55% of the goal.\n"
-            "     - NEVER emit a deal for tiny starter steps (e.g., 'put on your shoes', 'read two pages' for a 40-page goal).\n"
-            "     Examples: goal 'Run 2 km' -> deal 'Run 1 km' or 'Walk/jog 1.5 km'. Goal 'Read 40 pages' -> deal 'Read 22 pages'. Goal 'Sleep 5 hours' -> deal 'Sleep 3 hours'. NEVER 'lay down for 10 minutes' for a 5-hour sleep goal.\n"
-            "- Format: append ONE final line exactly as <DEAL>meaningful action</DEAL>. This line is metadata.\n\n"
+        user_msg_count = _count_user_turns(history, cap=_DEAL_MIN_USER_TURNS, since_journey=True)
+
+        deal_status = ""
+        if user_msg_count < _DEAL_MIN_USER_TURNS:
+            deal_status = _NEG_EARLY_STATUS_TMPL.format(n=user_msg_count)
+
+        prompt = _NEG_PROMPT_TMPL.format_map(
+            {
+                "goal": goal,
+                "transcript": transcript or "(empty)",
+                "deal_status": deal_status,
+                "user_msg": user_msg,
+            }
         )
 
-        if user_msg_count < 4:
-            deal_instruction += (
-                "CURRENT STATUS: Conversation just started (only {n} prior user messages). "
-                "Do NOT emit <DEAL> yet. Focus on empathy and understanding the user's situation.\n\n"
-            ).format(n=user_msg_count)
-
-        prompt = (
-            "You are FlexiFit. Follow the NEGOTIATION LOOP strictly.\n"
-            "Return 2-3 short sentences max.\n\n"
-            + deal_instruction
-            + f"GOAL: {goal}\n\n"
-            f"CHAT_HISTORY:\n{transcript if transcript else '(empty)'}\n\n"
-            f"NEW_MESSAGE (USER): {user_msg}\n"
-        )
+        async def _generate() -> str:
+            response = await _generate_with_retry(
+                prompt,
+                request_options={"timeout": 24},
+            )
 
-        response = _generate_with_retry(
-            prompt,
-            request_options={"timeout": 24},
+            text = (response.text or "").strip()
+            if not text:
+                raise ValueError("Empty AI response")
+            return text
+
+        # The per-RPC timeout doesn't bound 429 back-off or queueing behind the
+        # dispatcher, so cap the whole call on the wall clock as well.
+        return await asyncio.wait_for(
+            negotiator_cache.get_or_call(
+                make_key(GEMINI_MODEL, PROMPT_VERSION, prompt),
+                _generate,
+                semantic_text=f"{transcript}\nUSER: {user_msg}",
+                # Never reuse a reply written for a different goal.
+                semantic_scope=goal.strip().lower(),
+            ),
+            timeout=NEGOTIATOR_TIMEOUT_S,
         )
 
-        text = (response.text or "").strip()
-        if not text:
-            raise ValueError("Empty AI response")
-
-        return text
-
-    except TimeoutError:
+    except asyncio.TimeoutError:
         logger.exception("Gemini API timeout")
         raise HTTPException(status_code=504, detail="AI response timeout. Please try again.")
     except DeadlineExceeded:
@@ -573,6 +1300,9 @@ def call_gemini_negotiator(user_msg: str, goal: str, history: List[ChatMessage])
     except ResourceExhausted:
         logger.warning("Gemini rate limited (429) after retries")
         raise HTTPException(status_code=429, detail="AI is busy. Please wait a moment and try again.")
+    except ServiceUnavailable:
+        logger.warning("Gemini unavailable (503) after retries")
+        raise HTTPException(status_code=503, detail="AI is temporarily unavailable. Please try again.")
     except Exception as e:
         logger.exception("Unexpected error in Gemini call")
         raise HTTPException(status_code=500, detail=f"AI processing failed: {str(e)[:160]}")
@@ -587,7 +1317,7 @@ def call_gemini_negotiator(user_msg: str, goal: str, history: List[ChatMessage])
         "feature": "negotiator-loop-retry",
     },
 )
-def call_gemini_negotiator_retry(
+async def call_gemini_negotiator_retry(
     user_msg: str,
     goal: str,
     history: List[ChatMessage],
@@ -599,57 +1329,24 @@ def call_gemini_negotiator_retry(
 
     Intentionally capped to 1 retry to control latency/cost.
     """
-
-    def _history_to_transcript(items: List[ChatMessage]) -> str:
-        lines: List[str] = []
-        for msg in items[-12:]:
-            role = (msg.role or "").strip().lower()
-            text = (msg.text or "").strip()
-            if not text:
-                continue
-
-            if role in {"model", "assistant", "ai", "bot"}:
-                speaker = "FLEXIFIT"
-            elif role in {"user", "human"}:
-                speaker = "USER"
-            else:
-                continue
-
-            lines.append(f"{speaker}: {text}")
-        return "\n".join(lines)
-
     transcript = _history_to_transcript(history)
-    user_msg_count = sum(1 for m in history if (m.role or "").strip().lower() in {"user", "human"})
-
-    deal_clause = (
-        "If you propose a specific micro-habit for today that represents meaningful effort "
-        "(at least ~55%% of the main goal — NOT  a trivial starter step), "
-        "AND at least 4 prior user messages exist, "
-        "AND if the goal has a clear quantity+unit then the deal MUST match the unit and be >=55%%, "
-        "append ONE final line exactly as <DEAL>meaningful action</DEAL>. "
-        "This line is metadata and does not count as a sentence.\n"
-    )
-    if user_msg_count < 4:
-        deal_clause = "Do NOT emit a <DEAL> tag — conversation is too short.\n"
-
-    prompt = (
-        "You are FlexiFit. Your previous reply was judged as not empathetic enough. "
-        "Rewrite it to be more validating and more micro-habit-focused, while staying concise.\n"
-        "Constraints:\n"
-        "- 2-3 short sentences max\n"
-        "- Validate feelings first\n"
-        "- Propose ONE tiny, doable micro-habit\n"
-        "- No judgement, no lecturing\n\n"
-        + deal_clause + "\n"
-        f"GOAL: {goal}\n\n"
-        f"CHAT_HISTORY:\n{transcript if transcript else '(empty)'}\n\n"
-        f"NEW_MESSAGE (USER): {user_msg}\n\n"
-        f"PREVIOUS_REPLY: {previous_reply}\n"
-        f"JUDGE_SCORE: {judge_score}/5\n"
-        f"JUDGE_RATIONALE: {judge_rationale}\n"
+    user_msg_count = _count_user_turns(history, cap=_DEAL_MIN_USER_TURNS)
+
+    deal_clause = _NEG_RETRY_DEAL_CLAUSE if user_msg_count >= _DEAL_MIN_USER_TURNS else _NEG_RETRY_NO_DEAL_CLAUSE
+
+    prompt = _NEG_RETRY_PROMPT_TMPL.format_map(
+        {
+            "deal_clause": deal_clause,
+            "goal": goal,
+            "transcript": transcript or "(empty)",
+            "user_msg": user_msg,
+            "previous_reply": previous_reply,
+            "judge_score": judge_score,
+            "judge_rationale": judge_rationale,
+        }
     )
 
-    response = _generate_with_retry(
+    response = await _generate_with_retry(
         prompt,
         request_options={"timeout": 20},
     )
@@ -670,76 +1367,269 @@ def call_gemini_negotiator_retry(
         "scale": "1_to_5",
     },
 )
-def call_gemini_empathy_judge(user_text: str, ai_text: str) -> dict:
+async def call_gemini_empathy_judge(user_text: str, ai_text: str) -> dict:
     """Return a strict JSON dict: { empathy: 1..5, rationale: string }.
 
     This is an online LLM-as-a-judge evaluation for every AI reply.
     """
-    prompt = (
-        "You are an evaluator for a habit-coaching AI. "
-        "Score the AI reply for EMPATHY + MICRO-HABIT behavior. "
-        "Return STRICT JSON only (no markdown).\n"
-        "Schema: {\"empathy\": 1|2|3|4|5, \"rationale\": \"...\"}.\n"
-        "Scoring (1-5):\n"
-        "- 5: Clearly validates feelings + proposes an ultra-small, doable micro-habit + supportive tone.\n"
-        "- 4: Validates feelings + proposes a realistic micro-habit, minor wording issues.\n"
-        "- 3: Some empathy OR some micro-habit, but not both strongly.\n"
-        "- 2: Weak empathy and vague/too-big action step.\n"
-        "- 1: No empathy, dismissive, or no actionable micro-habit.\n\n"
-        f"USER: {user_text}\n"
-        f"AI: {ai_text}\n"
-    )
+    prompt = _JUDGE_PROMPT_TMPL.format_map({"user_text": user_text, "ai_text": ai_text})
 
-    response = _generate_with_retry(
+    payload = await _generate_json(
         prompt,
         request_options={"timeout": 10},
+        generation_config=_JUDGE_GENERATION_CONFIG,
     )
-
-    raw = (response.text or "").strip()
-    start = raw.find("{")
-    end = raw.rfind("}")
-    if start != -1 and end != -1 and end > start:
-        raw = raw[start : end + 1]
-
-    payload = json.loads(raw)
     if not isinstance(payload, dict):
         raise ValueError("Empathy evaluation must be a JSON object")
 
+    return _coerce_empathy_payload(payload)
+
+
+def _coerce_empathy_payload(payload: dict) -> dict:
     empathy = payload.get("empathy")
     if isinstance(empathy, bool):
         empathy = 5 if empathy else 1
     if not isinstance(empathy, (int, float)):
         raise ValueError("Empathy must be 1..5")
 
-
     empathy = int(round(float(empathy)))
     empathy = max(1, min(5, empathy))
-    rationale = payload.get("rationale")
-    rationale_text = str(rationale).strip() if rationale is not None else ""
+    return {"empathy": empathy, "rationale": _clean_str(payload.get("rationale"))}
 
-    return {"empathy": empathy, "rationale": rationale_text}
+
+@track(
+    name="flexifit_eval_empathy_batch",
+    tags=["eval", "llm-as-judge", "empathy", "batch"],
+    metadata={
+        "model": GEMINI_MODEL,
+        "prompt_version": PROMPT_VERSION,
+        "metric": "empathy_score",
+        "scale": "1_to_5",
+    },
+)
+async def call_gemini_empathy_judge_batch(pairs: List[tuple[str, str]]) -> List[dict]:
+    """Score several (user_text, ai_text) exchanges in one Gemini call.
+
+    Returns one {empathy, rationale} dict per pair, in input order.
+    """
+    exchanges = "".join(
+        f"EXCHANGE {i}:\nUSER: {user_text}\nAI: {ai_text}\n\n"
+        for i, (user_text, ai_text) in enumerate(pairs)
+    )
+    prompt = _JUDGE_BATCH_PROMPT_TMPL.format_map({"exchanges": exchanges})
+
+    response = await _generate_with_retry(
+        prompt,
+        request_options={"timeout": 15},
+        generation_config=_JUDGE_BATCH_GENERATION_CONFIG,
+    )
+
+    payload = _json_loads((response.text or "").strip())
+    if not isinstance(payload, list):
+        raise ValueError("Batch empathy evaluation must be a JSON array")
+
+    by_index = {}
+    for item in payload:
+        if isinstance(item, dict) and isinstance(item.get("index"), int):
+            by_index[item["index"]] = _coerce_empathy_payload(item)
+    if len(by_index) != len(pairs) or any(i not in by_index for i in range(len(pairs))):
+        raise ValueError("Batch empathy evaluation is missing exchanges")
+    return [by_index[i] for i in range(len(pairs))]
+
+
+class _JudgeBatcher:
+    """Coalesce judge calls that arrive within a short window.
+
+    Only used when JUDGE_BATCH_WINDOW_MS is above 0 (it defaults to 0).
+
+    The first call opens a window; everything queued when it closes (or once
+    `max_batch` is reached) is scored in one request. A lone call uses the
+    regular single-exchange judge, and a failed batch falls back to it too.
+
+    Single-exchange calls run in their caller's context, so their Opik spans
+    land in that request's trace. A multi-item batch call belongs to no one
+    request and is traced on its own, not per request.
+    """
+
+    def __init__(self, window_s: float, max_batch: int):
+        self.window_s = window_s
+        self.max_batch = max(1, max_batch)
+        self._pending: List[tuple[str, str, asyncio.Future, contextvars.Context]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._tasks: set = set()
+
+    async def judge(self, user_text: str, ai_text: str) -> dict:
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._pending.append((user_text, ai_text, fut, contextvars.copy_context()))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.window_s, self._flush)
+        return await fut
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if batch:
+            # Fresh context: the timer fired inside whichever request opened
+            # the window, and the batch must not be traced under it.
+            task = contextvars.Context().run(asyncio.create_task, self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[tuple[str, str, asyncio.Future, contextvars.Context]]) -> None:
+        results: List[Any] = []
+        if len(batch) > 1:
+            try:
+                results = await call_gemini_empathy_judge_batch([(u, a) for u, a, _, _ in batch])
+            except Exception as e:
+                logger.warning(f"⚠ Batch empathy eval failed, scoring individually: {e}")
+        if not results:
+            # Tasks inherit the context current at creation, i.e. the caller's.
+            results = await asyncio.gather(
+                *(ctx.run(asyncio.create_task, call_gemini_empathy_judge(u, a)) for u, a, _, ctx in batch),
+                return_exceptions=True,
+            )
+
+        for (_, _, fut, _), result in zip(batch, results):
+            if fut.done():
+                continue
+            if isinstance(result, BaseException):
+                fut.set_exception(result)
+            else:
+                fut.set_result(result)
+
+
+_judge_batcher = _JudgeBatcher(JUDGE_BATCH_WINDOW_MS / 1000.0, JUDGE_BATCH_MAX)
+
+
+async def _judge_empathy(user_text: str, ai_text: str) -> dict:
+    if JUDGE_BATCH_WINDOW_MS <= 0:
+        return await call_gemini_empathy_judge(user_text, ai_text)
+    return await _judge_batcher.judge(user_text, ai_text)
+
+
+# Panel of judges: when the score can trigger a retry, a second (cheaper)
+# model scores the same reply in parallel and the two scores are averaged,
+# so one noisy sample doesn't force a rewrite.
+MULTI_JUDGE = str(os.getenv("MULTI_JUDGE", "false")).strip().lower() in {"1", "true", "yes", "on"}
+GEMINI_JUDGE_LITE_MODEL = (os.getenv("GEMINI_JUDGE_LITE_MODEL") or "gemini-2.5-flash-lite").strip()
+judge_lite_model = genai.GenerativeModel(model_name=GEMINI_JUDGE_LITE_MODEL) if MULTI_JUDGE else None
+
+
+@app.on_event("startup")
+async def _share_judge_lite_client() -> None:
+    # The async client is not tied to a model name; reuse the keepalive one.
+    if judge_lite_model is not None and getattr(model, "_async_client", None) is not None:
+        judge_lite_model._async_client = model._async_client
+
+
+@track(
+    name="flexifit_eval_empathy_lite",
+    tags=["eval", "llm-as-judge", "empathy", "panel"],
+    metadata={
+        "model": GEMINI_JUDGE_LITE_MODEL,
+        "prompt_version": PROMPT_VERSION,
+        "metric": "empathy_score",
+        "scale": "1_to_5",
+    },
+)
+async def call_gemini_empathy_judge_lite(user_text: str, ai_text: str) -> dict:
+    """Second-opinion empathy score from the lite model (same rubric)."""
+    prompt = _JUDGE_PROMPT_TMPL.format_map({"user_text": user_text, "ai_text": ai_text})
+
+    payload = await _generate_json(
+        prompt,
+        request_options={"timeout": 10},
+        generation_config=_JUDGE_GENERATION_CONFIG,
+        target_model=judge_lite_model,
+    )
+    if not isinstance(payload, dict):
+        raise ValueError("Empathy evaluation must be a JSON object")
+
+    return _coerce_empathy_payload(payload)
+
+
+async def _judge_empathy_panel(user_text: str, ai_text: str) -> dict:
+    if not (MULTI_JUDGE and RETRY_ON_LOW_EMPATHY):
+        return await _judge_empathy(user_text, ai_text)
+
+    primary, lite = await asyncio.gather(
+        _judge_empathy(user_text, ai_text),
+        call_gemini_empathy_judge_lite(user_text, ai_text),
+        return_exceptions=True,
+    )
+    if isinstance(lite, BaseException):
+        logger.warning(f"⚠ Lite empathy judge skipped: {lite}")
+        if isinstance(primary, BaseException):
+            raise primary
+        return primary
+    if isinstance(primary, BaseException):
+        return lite
+
+    return {
+        "empathy": (primary["empathy"] + lite["empathy"]) / 2,
+        "rationale": primary["rationale"],
+    }
+
+
+# One alternation so each message is scanned once instead of once per phrase.
+_MICRO_HABIT_RE = re.compile(
+    r"\b(?:how about|let'?s|commit|just|2\s*-?\s*minute|5\s*-?\s*minute|micro\s*-?\s*habit|tiny)\b",
+    re.IGNORECASE,
+)
+
+
+# Exact (unnormalized) roles counted by the micro-habit heuristic.
+_MICRO_HABIT_ROLES = frozenset({"model", "assistant"})
 
 
 def _estimate_micro_habits_offered(history: List[ChatMessage]) -> int:
-    patterns = [
-        r"\bhow about\b",
-        r"\blet'?s\b",
-        r"\bcommit\b",
-        r"\bjust\b",
-        r"\b2\s*-?\s*minute\b",
-        r"\b5\s*-?\s*minute\b",
-        r"\bmicro\s*-?\s*habit\b",
-        r"\btiny\b",
-    ]
+    # IGNORECASE in the pattern spares a lowered copy of every message.
+    search = _MICRO_HABIT_RE.search
+    return sum(1 for msg in history if msg.role in _MICRO_HABIT_ROLES and search(msg.text or ""))
+
+
+# Fallbacks when Gemini is unavailable or answers in the wrong language.
+_DEFAULT_INSIGHTS = "- Keep the habit tiny today.\n- Pick one micro-step and do it now.\n- Consistency beats intensity."
+_DEFAULT_MOTIVATION = "Keep it tiny today—one small action keeps the habit alive."
+_DEFAULT_WEEKLY_MOTIVATION = "Tiny steps count—do the smallest version today and keep the streak alive."
+
+_INSIGHTS_RULES = (
+    "Keys: insights (string), micro_habits_offered (integer).\n"
+    "Rules:\n"
+    "- insights must be a single STRING with 2–3 bullet lines, each starting with '- '.\n"
+    "- Include exactly one next micro-habit suggestion as the final bullet.\n"
+    "- Keep each bullet short and concrete.\n\n"
+    "GOAL: {goal}\n\n"
+    "CHAT_HISTORY:\n{transcript}\n"
+)
+_INSIGHTS_PROMPT_TMPL = (
+    "You analyze a user's habit-coaching chat history and summarize progress. "
+    "Write in {lang_label}. Return STRICT JSON only (no markdown).\n"
+    + _INSIGHTS_RULES
+)
+_INSIGHTS_EN_RETRY_PROMPT_TMPL = (
+    "You analyze a user's habit-coaching chat history and summarize progress. "
+    "IMPORTANT: Write in English only. If the chat history contains Indonesian, translate it and still answer in English. "
+    "Return STRICT JSON only (no markdown).\n"
+    + _INSIGHTS_RULES
+)
 
-    count = 0
-    for msg in history:
-        if msg.role not in {"model", "assistant"}:
-            continue
-        text = (msg.text or "").lower()
-        if any(re.search(p, text) for p in patterns):
-            count += 1
-    return count
+_INSIGHTS_GENERATION_CONFIG = {
+    "response_mime_type": "application/json",
+    "response_schema": {
+        "type": "object",
+        "properties": {
+            "insights": {"type": "string"},
+            "micro_habits_offered": {"type": "integer"},
+        },
+        "required": ["insights", "micro_habits_offered"],
+    },
+}
 
 
 @track(
@@ -751,7 +1641,7 @@ def _estimate_micro_habits_offered(history: List[ChatMessage]) -> int:
         "feature": "progress-insights",
     },
 )
-def call_gemini_progress_insights(
+async def call_gemini_progress_insights(
     goal: str,
     history: List[ChatMessage],
     language: Optional[str] = None,
@@ -762,84 +1652,78 @@ def call_gemini_progress_insights(
     - insights: short string (max ~3 bullets)
     - micro_habits_offered: int estimate
     """
-    transcript = "\n".join(
-        [f"{m.role.upper()}: {m.text}" for m in history[-20:]]
-    )
+    transcript = _history_to_raw_transcript(history)
 
     lang_label = _language_label(language)
 
-    prompt = (
-        "You analyze a user's habit-coaching chat history and summarize progress. "
-        f"Write in {lang_label}. Return STRICT JSON only (no markdown).\n"
-        "Keys: insights (string), micro_habits_offered (integer).\n"
-        "Rules:\n"
-        "- insights must be a single STRING with 2–3 bullet lines, each starting with '- '.\n"
-        "- Include exactly one next micro-habit suggestion as the final bullet.\n"
-        "- Keep each bullet short and concrete.\n\n"
-        f"GOAL: {goal}\n\n"
-        f"CHAT_HISTORY:\n{transcript}\n"
+    prompt = _INSIGHTS_PROMPT_TMPL.format_map(
+        {"lang_label": lang_label, "goal": goal, "transcript": transcript}
     )
 
-    response = _generate_with_retry(
+    payload = await _generate_json(
         prompt,
         request_options={"timeout": 10},
+        generation_config=_INSIGHTS_GENERATION_CONFIG,
     )
-
-    raw = (response.text or "").strip()
-    start = raw.find("{")
-    end = raw.rfind("}")
-    if start != -1 and end != -1 and end > start:
-        raw = raw[start : end + 1]
-
-    payload = json.loads(raw)
     if not isinstance(payload, dict):
         raise ValueError("Progress insights must be a JSON object")
 
     # Coerce insights to a clean bullet string (handles list outputs).
     payload["insights"] = _coerce_insights_bullets(payload.get("insights"))
-    insights_text = str(payload.get("insights") or "").strip()
-
-    if _normalize_language(language) == "en" and insights_text and _looks_indonesian(insights_text):
-        retry_prompt = (
-            "You analyze a user's habit-coaching chat history and summarize progress. "
-            "IMPORTANT: Write in English only. If the chat history contains Indonesian, translate it and still answer in English. "
-            "Return STRICT JSON only (no markdown).\n"
-            "Keys: insights (string), micro_habits_offered (integer).\n"
-            "Rules:\n"
-            "- insights must be a single STRING with 2–3 bullet lines, each starting with '- '.\n"
-            "- Include exactly one next micro-habit suggestion as the final bullet.\n"
-            "- Keep each bullet short and concrete.\n\n"
-            f"GOAL: {goal}\n\n"
-            f"CHAT_HISTORY:\n{transcript}\n"
+    insights_text = _clean_str(payload.get("insights"))
+
+    # Only pay for the English rewrite when the input could have pulled the
+    # model into Indonesian; the hard-guard below still catches stragglers.
+    input_may_be_indonesian = _looks_indonesian(goal) or _looks_indonesian(transcript)
+    if (
+        _normalize_language(language) == "en"
+        and input_may_be_indonesian
+        and insights_text
+        and _looks_indonesian(insights_text)
+    ):
+        retry_prompt = _INSIGHTS_EN_RETRY_PROMPT_TMPL.format_map(
+            {"goal": goal, "transcript": transcript}
         )
         try:
-            retry = _generate_with_retry(
+            retry_payload = await _generate_json(
                 retry_prompt,
                 request_options={"timeout": 10},
+                generation_config=_INSIGHTS_GENERATION_CONFIG,
             )
-            retry_raw = (retry.text or "").strip()
-            s = retry_raw.find("{")
-            e = retry_raw.rfind("}")
-            if s != -1 and e != -1 and e > s:
-                retry_raw = retry_raw[s : e + 1]
-            retry_payload = json.loads(retry_raw)
             if isinstance(retry_payload, dict):
                 retry_payload["insights"] = _coerce_insights_bullets(retry_payload.get("insights"))
-                retry_insights = str(retry_payload.get("insights") or "").strip()
+                retry_insights = _clean_str(retry_payload.get("insights"))
                 if retry_insights and not _looks_indonesian(retry_insights):
                     payload = retry_payload
         except Exception:
             pass
 
-    final_insights = str(payload.get("insights") or "").strip()
+    final_insights = _clean_str(payload.get("insights"))
     if not final_insights:
-        payload["insights"] = "- Keep the habit tiny today.\n- Pick one micro-step and do it now.\n- Consistency beats intensity."
+        payload["insights"] = _DEFAULT_INSIGHTS
     elif _normalize_language(language) == "en" and _looks_indonesian(final_insights):
-        payload["insights"] = "- Keep the habit tiny today.\n- Pick one micro-step and do it now.\n- Consistency beats intensity."
+        payload["insights"] = _DEFAULT_INSIGHTS
 
     return payload
 
 
+_WEEKLY_PROMPT_TMPL = (
+    "You are a tough-but-supportive fitness coach. "
+    "Return ONLY ONE sentence in {lang_label} (no markdown, no bullet points). "
+    "Keep it short (max 20 words), direct, and motivating.\n\n"
+    "GOAL: {goal}\n"
+    "WEEKLY_COMPLETION_RATE: {completion_rate_7d:.0f}%\n"
+    "LAST_7_DAYS: {days_compact}\n"
+    "DONE_DAYS: {done_days}/{total_days}\n"
+)
+_WEEKLY_EN_REWRITE_PROMPT_TMPL = (
+    "Rewrite the following text into English. "
+    "Return ONLY ONE sentence, max 20 words, no markdown, no bullet points. "
+    "Do NOT include any Indonesian words.\n\n"
+    "TEXT: {text}\n"
+)
+
+
 @track(
     name="flexifit_weekly_motivation",
     tags=["progress", "motivation", "weekly"],
@@ -849,7 +1733,7 @@ def call_gemini_progress_insights(
         "feature": "weekly-motivation",
     },
 )
-def call_gemini_weekly_motivation(
+async def call_gemini_weekly_motivation(
     goal: str,
     completion_rate_7d: float,
     last7_days: List[DayCompletion],
@@ -864,39 +1748,37 @@ def call_gemini_weekly_motivation(
 
     lang_label = _language_label(language)
 
-    prompt = (
-        "You are a tough-but-supportive fitness coach. "
-        f"Return ONLY ONE sentence in {lang_label} (no markdown, no bullet points). "
-        "Keep it short (max 20 words), direct, and motivating.\n\n"
-        f"GOAL: {goal}\n"
-        f"WEEKLY_COMPLETION_RATE: {completion_rate_7d:.0f}%\n"
-        f"LAST_7_DAYS: {days_compact}\n"
-        f"DONE_DAYS: {done_days}/{total_days}\n"
+    prompt = _WEEKLY_PROMPT_TMPL.format_map(
+        {
+            "lang_label": lang_label,
+            "goal": goal,
+            "completion_rate_7d": completion_rate_7d,
+            "days_compact": days_compact,
+            "done_days": done_days,
+            "total_days": total_days,
+        }
     )
 
-    response = _generate_with_retry(
+    response = await _generate_with_retry(
         prompt,
         request_options={"timeout": 10},
     )
 
     text = (response.text or "").strip()
     # Keep it a single line/sentence.
-    text = re.sub(r"\s+", " ", text)
+    text = _WS_RE.sub(" ", text)
     text = text.strip().strip("\"").strip()
 
-    if _normalize_language(language) == "en" and _looks_indonesian(text):
-        rewrite_prompt = (
-            "Rewrite the following text into English. "
-            "Return ONLY ONE sentence, max 20 words, no markdown, no bullet points. "
-            "Do NOT include any Indonesian words.\n\n"
-            f"TEXT: {text}\n"
-        )
+    # The goal is the only free text in the prompt; without Indonesian there
+    # the rewrite call is skipped and the hard-guard below is the backstop.
+    if _normalize_language(language) == "en" and _looks_indonesian(goal) and _looks_indonesian(text):
+        rewrite_prompt = _WEEKLY_EN_REWRITE_PROMPT_TMPL.format_map({"text": text})
         try:
-            rewrite = _generate_with_retry(
+            rewrite = await _generate_with_retry(
                 rewrite_prompt,
                 request_options={"timeout": 10},
             )
-            rewritten = re.sub(r"\s+", " ", (rewrite.text or "").strip())
+            rewritten = _WS_RE.sub(" ", (rewrite.text or "").strip())
             rewritten = rewritten.strip().strip("\"").strip()
             if rewritten and not _looks_indonesian(rewritten):
                 text = rewritten
@@ -904,11 +1786,11 @@ def call_gemini_weekly_motivation(
             pass
 
     if not text:
-        return "Tiny steps count—do the smallest version today and keep the streak alive."
+        return _DEFAULT_WEEKLY_MOTIVATION
 
     # Final hard-guard for English requests.
     if _normalize_language(language) == "en" and _looks_indonesian(text):
-        return "Tiny steps count—do the smallest version today and keep the streak alive."
+        return _DEFAULT_WEEKLY_MOTIVATION
 
     return text
 
@@ -921,6 +1803,42 @@ _ALLOWED_AVATAR_IDS = {
     "SPORTY_CAT",
     "WORKOUT_WOLF",
 }
+_ALLOWED_AVATAR_IDS_SORTED = tuple(sorted(_ALLOWED_AVATAR_IDS))
+
+# Static head of the persona prompt; only the language and user data vary.
+_PERSONA_PROMPT_PREFIX = (
+    "You are a witty but supportive habit-coach game designer. "
+    "Analyze the user data and generate a playful, slightly quirky RPG-style persona. "
+    "Be motivating, not insulting. Keep it punchy.\n"
+    "Return STRICT JSON only (no markdown, no extra text).\n"
+    "Schema: {\"archetype_title\": string, \"description\": string, \"avatar_id\": string, \"power_level\": integer}.\n"
+    "Rules:\n"
+    f"- avatar_id MUST be exactly one of: {list(_ALLOWED_AVATAR_IDS_SORTED)}\n"
+)
+_PERSONA_PROMPT_TAIL_TMPL = (
+    "- archetype_title: 2-5 words, {lang_label} (funny, punchy).\n"
+    "- description: 1-2 short sentences in {lang_label}, funny but supportive.\n"
+    "- power_level: 1..100 (higher = more consistent).\n\n"
+    "GOAL: {goal}\n"
+    "COMPLETION_RATE_7D: {completion_rate_7d:.0f}%\n"
+    "STREAK_DAYS: {streak}\n"
+    "DONE_DAYS: {done_days}/{total_days}\n"
+    "LAST_7_DAYS: {days_compact}\n\n"
+    "CHAT_HISTORY:\n{transcript}\n"
+)
+_PERSONA_GENERATION_CONFIG = {
+    "response_mime_type": "application/json",
+    "response_schema": {
+        "type": "object",
+        "properties": {
+            "archetype_title": {"type": "string"},
+            "description": {"type": "string"},
+            "avatar_id": {"type": "string", "enum": list(_ALLOWED_AVATAR_IDS_SORTED)},
+            "power_level": {"type": "integer"},
+        },
+        "required": ["archetype_title", "description", "avatar_id", "power_level"],
+    },
+}
 
 
 @track(
@@ -932,7 +1850,7 @@ _ALLOWED_AVATAR_IDS = {
         "feature": "flexi-archetype",
     },
 )
-def call_gemini_persona(payload: PersonaRequest) -> dict:
+async def call_gemini_persona(payload: PersonaRequest) -> dict:
     """Generate a 'Flexi Archetype' persona as strict JSON."""
 
     done_days = sum(1 for d in payload.last7_days if bool(d.done))
@@ -942,57 +1860,35 @@ def call_gemini_persona(payload: PersonaRequest) -> dict:
         [f"{d.date}:{'done' if d.done else 'miss'}" for d in payload.last7_days]
     )
 
-    transcript = "\n".join(
-        [f"{m.role.upper()}: {m.text}" for m in (payload.chat_history or [])[-20:]]
-    )
+    transcript = _history_to_raw_transcript(payload.chat_history or [])
 
     lang_label = _language_label(payload.language)
 
-    prompt = (
-        "You are a witty but supportive habit-coach game designer. "
-        "Analyze the user data and generate a playful, slightly quirky RPG-style persona. "
-        "Be motivating, not insulting. Keep it punchy.\n"
-        "Return STRICT JSON only (no markdown, no extra text).\n"
-        "Schema: {\"archetype_title\": string, \"description\": string, \"avatar_id\": string, \"power_level\": integer}.\n"
-        "Rules:\n"
-        f"- avatar_id MUST be exactly one of: {sorted(_ALLOWED_AVATAR_IDS)}\n"
-        f"- archetype_title: 2-5 words, {lang_label} (funny, punchy).\n"
-        f"- description: 1-2 short sentences in {lang_label}, funny but supportive.\n"
-        "- power_level: 1..100 (higher = more consistent).\n\n"
-        f"GOAL: {payload.current_goal}\n"
-        f"COMPLETION_RATE_7D: {float(payload.completion_rate_7d):.0f}%\n"
-        f"STREAK_DAYS: {int(payload.streak)}\n"
-        f"DONE_DAYS: {done_days}/{total_days}\n"
-        f"LAST_7_DAYS: {days_compact}\n\n"
-        f"CHAT_HISTORY:\n{transcript if transcript else '(empty)'}\n"
+    prompt = _PERSONA_PROMPT_PREFIX + _PERSONA_PROMPT_TAIL_TMPL.format_map(
+        {
+            "lang_label": lang_label,
+            "goal": payload.current_goal,
+            "completion_rate_7d": float(payload.completion_rate_7d),
+            "streak": int(payload.streak),
+            "done_days": done_days,
+            "total_days": total_days,
+            "days_compact": days_compact,
+            "transcript": transcript or "(empty)",
+        }
     )
 
-    response = _generate_with_retry(
+    data = await _generate_json(
         prompt,
         request_options={"timeout": 12},
+        generation_config=_PERSONA_GENERATION_CONFIG,
     )
-
-    raw = (response.text or "").strip()
-    start = raw.find("{")
-    end = raw.rfind("}")
-    if start != -1 and end != -1 and end > start:
-        raw = raw[start : end + 1]
-
-    data = json.loads(raw)
     if not isinstance(data, dict):
         raise ValueError("Persona output must be a JSON object")
 
-    title = str(data.get("archetype_title") or "").strip()
-    desc = str(data.get("description") or "").strip()
-    avatar_id = str(data.get("avatar_id") or "").strip().upper()
-
-    power_level = data.get("power_level")
-    if isinstance(power_level, bool):
-        power_level = 50
-    if not isinstance(power_level, (int, float)):
-        power_level = 50
-    power_level = int(round(float(power_level)))
-    power_level = max(1, min(100, power_level))
+    title = _clean_str(data.get("archetype_title"))
+    desc = _clean_str(data.get("description"))
+    avatar_id = _clean_str(data.get("avatar_id")).upper()
+    power_level = _clean_int(data.get("power_level"), 50, 1, 100)
 
     if avatar_id not in _ALLOWED_AVATAR_IDS:
         # Safe fallback mapping.
@@ -1010,51 +1906,182 @@ def call_gemini_persona(payload: PersonaRequest) -> dict:
         "power_level": power_level,
     }
 
-@app.get("/")
-async def root():
-    return {
-        "message": "FlexiFit Backend is running!", 
+# Probe endpoints: everything but the cache counters is fixed at import, so
+# "/" is served as pre-encoded bytes and /health only adds the live counters.
+_ROOT_BODY = _DEFAULT_RESPONSE_CLASS(
+    {
+        "message": "FlexiFit Backend is running!",
         "status": "healthy",
         "version": "1.0.0",
         "methodology": "BJ Fogg Tiny Habits",
-        "observability": "Opik Enabled" if OPIK_ENABLED else "Opik Disabled"
+        "observability": "Opik Enabled" if OPIK_ENABLED else "Opik Disabled",
     }
+).body
+
+_HEALTH_STATIC = {
+    "status": "healthy",
+    "opik": "configured" if OPIK_ENABLED else "disabled",
+    "opik_error": None if OPIK_ENABLED else OPIK_CONFIG_ERROR,
+    "gemini": "ready",
+    "gemini_model": GEMINI_MODEL,
+    "prompt_version": PROMPT_VERSION,
+    "opik_project": OPIK_PROJECT_NAME,
+}
+_HEALTH_EVALS = {
+    "empathy_score": {
+        "enabled": True,
+        "type": "llm-as-judge",
+        "scale": "1-5",
+    },
+}
+
+
+@app.get("/")
+async def root():
+    return Response(content=_ROOT_BODY, media_type="application/json")
 
 @app.get("/health")
 async def health_check():
-    return {
-        "status": "healthy",
-        "opik": "configured" if OPIK_ENABLED else "disabled",
-        "opik_error": None if OPIK_ENABLED else OPIK_CONFIG_ERROR,
-        "gemini": "ready",
-        "gemini_model": GEMINI_MODEL,
-        "prompt_version": PROMPT_VERSION,
-        "opik_project": os.getenv("OPIK_PROJECT_NAME", "flexifit-hackathon"),
-        "evals": {
-            "empathy_score": {
-                "enabled": True,
-                "type": "llm-as-judge",
-                "scale": "1-5",
+    return _DEFAULT_RESPONSE_CLASS(
+        {
+            **_HEALTH_STATIC,
+            "cache": {
+                "negotiator": {
+                    "hits": negotiator_cache.hits,
+                    "semantic_hits": negotiator_cache.semantic_hits,
+                    "misses": negotiator_cache.misses,
+                },
             },
-        },
-    }
+            "gemini_dispatcher": {
+                "max_concurrency": gemini_dispatcher.max_concurrency,
+                **gemini_dispatcher.wait_stats(),
+            },
+            "evals": _HEALTH_EVALS,
+        }
+    )
+
+# Opt-in fast path for unambiguous one-liners, mirroring the few-shot
+# examples in SYSTEM_INSTRUCTION. Anything longer, negated, not in English or
+# Indonesian, or matching more than one state still goes to Gemini.
+CHAT_FAST_PATH = str(os.getenv("CHAT_FAST_PATH", "false")).strip().lower() in {"1", "true", "yes", "on"}
+_FAST_PATH_MAX_CHARS = 60
+
+# language -> (negation regex, ((state, regex, reply templates), ...)).
+# The goal is quoted rather than spliced into the sentence, since users
+# type it in any case and wording ("Run 5km", "lari pagi").
+_FAST_PATH_RULES = {
+    "en": (
+        re.compile(r"\b(?:not|never|can'?t|don'?t|won'?t|isn'?t|but)\b|n't\b", re.IGNORECASE),
+        (
+            (
+                "MOTIVATED",
+                re.compile(r"\b(?:ready|let'?s go|pumped|motivated|fired up|let'?s do (?:it|this))\b", re.IGNORECASE),
+                (
+                    'Love the energy! Go crush your goal "{goal}"! 💪',
+                    'That\'s the spirit! Enjoy working on "{goal}" today — you\'ve got this! 💪',
+                ),
+            ),
+            (
+                "TIRED",
+                re.compile(r"\b(?:tired|exhausted|drained|sleepy|worn out|wiped out)\b", re.IGNORECASE),
+                (
+                    'Totally get it — rest matters. How about a tiny version of your goal "{goal}": just 5 minutes to keep your streak alive?',
+                    'Being tired is real. Could you do just the first 2 minutes of "{goal}"? Even 1% keeps the habit pathway alive! 🧠',
+                ),
+            ),
+            (
+                "BUSY",
+                re.compile(r"\b(?:busy|no time|swamped|slammed|packed day)\b", re.IGNORECASE),
+                (
+                    'Busy days happen! Can you do a 2-minute version of your goal "{goal}" right now? Keeps the habit pathway strong.',
+                    'Tight day, got it. What\'s the smallest slice of "{goal}" you could fit in while waiting on something today?',
+                ),
+            ),
+        ),
+    ),
+    "id": (
+        re.compile(r"\b(?:tidak|tak|nggak|ngga|gak|ga|enggak|bukan|belum|jangan|tapi)\b", re.IGNORECASE),
+        (
+            (
+                "MOTIVATED",
+                re.compile(r"\b(?:siap|semangat|ayo|yuk|gas|termotivasi)\b", re.IGNORECASE),
+                (
+                    'Semangatnya keren! Gas terus untuk target "{goal}"! 💪',
+                    'Mantap! Nikmati "{goal}" hari ini — kamu pasti bisa! 💪',
+                ),
+            ),
+            (
+                "TIRED",
+                re.compile(r"\b(?:capek|cape|capai|lelah|letih|ngantuk|kecapekan)\b", re.IGNORECASE),
+                (
+                    'Wajar banget, istirahat itu penting. Gimana kalau versi mini dari target "{goal}": cukup 5 menit biar streak-mu tetap jalan?',
+                    'Capek itu nyata. Bisa coba 2 menit pertama dari "{goal}" saja? Sedikit pun tetap menjaga kebiasaanmu! 🧠',
+                ),
+            ),
+            (
+                "BUSY",
+                re.compile(r"\b(?:sibuk|repot|jadwal padat|hari padat)\b", re.IGNORECASE),
+                (
+                    'Hari sibuk itu wajar! Bisa lakukan versi 2 menit dari target "{goal}" sekarang? Kebiasaanmu tetap terjaga.',
+                    'Jadwal padat, paham. Bagian terkecil dari "{goal}" apa yang bisa kamu selipkan hari ini?',
+                ),
+            ),
+        ),
+    ),
+}
+_fast_path_stats = {"hits": 0, "total": 0}
+
+
+def _fast_path_reply(user_msg: str, goal: str, language: Optional[str]) -> Optional[str]:
+    """Return a templated reply when exactly one user state clearly matches."""
+
+    _fast_path_stats["total"] += 1
+    text = user_msg.strip()
+    lang = _normalize_language(language)
+    rules = _FAST_PATH_RULES.get(lang)
+    if rules is None or len(text) > _FAST_PATH_MAX_CHARS:
+        return None
+    negation_re, states = rules
+    if (lang == "en" and _looks_indonesian(text)) or negation_re.search(text):
+        return None
+    matched = [replies for _, pattern, replies in states if pattern.search(text)]
+    if len(matched) != 1:
+        return None
 
+    _fast_path_stats["hits"] += 1
+    logger.info(
+        f"✓ Chat fast path | bypass rate {_fast_path_stats['hits']}/{_fast_path_stats['total']}"
+    )
+    return random.choice(matched[0]).format(goal=goal.strip())
+
+
+# Hot endpoints assemble plain dicts and return the response class directly.
+# response_model stays on the routes for the OpenAPI schema, but FastAPI skips
+# the outbound Pydantic validation/serialization pass when given a Response.
 @app.post("/chat", response_model=ChatResponse)
 async def chat_endpoint(request: ChatRequest):
+    return _DEFAULT_RESPONSE_CLASS(await _chat_reply(request))
+
 
+async def _chat_reply(request: ChatRequest) -> dict:
     try:
-        if not request.user_message.strip():
+        if _is_blank(request.user_message):
             raise HTTPException(status_code=400, detail="Message cannot be empty")
         
-        if not request.current_goal.strip():
+        if _is_blank(request.current_goal):
             raise HTTPException(status_code=400, detail="Goal must be set")
-
-        # Call AI with enhanced Opik tracking
-        ai_reply = call_gemini_negotiator(
-            user_msg=request.user_message,
-            goal=request.current_goal,
-            history=request.chat_history
-        )
+        _check_history_size(request.chat_history)
+
+        ai_reply = None
+        if CHAT_FAST_PATH:
+            ai_reply = _fast_path_reply(request.user_message, request.current_goal, request.language)
+        if ai_reply is None:
+            # Call AI with enhanced Opik tracking
+            ai_reply = await call_gemini_negotiator(
+                user_msg=request.user_message,
+                goal=request.current_goal,
+                history=request.chat_history
+            )
 
         cleaned_reply, deal_label = _extract_deal_meta(ai_reply)
         deal_made = True if deal_label else False
@@ -1064,27 +2091,22 @@ async def chat_endpoint(request: ChatRequest):
         empathy_rationale: Optional[str] = None
         retry_used: bool = False
         initial_empathy_score: Optional[float] = None
+        # Reply -> judge -> (retry -> re-judge) is a strict dependency chain: the
+        # judge scores the cleaned reply and the retry prompt embeds the judge's
+        # score/rationale, so these calls cannot be overlapped. Concurrency comes
+        # from the async Gemini client across requests (and /chat/batch).
         try:
-            judged = call_gemini_empathy_judge(request.user_message, ai_reply)
+            judged = await _judge_empathy_panel(request.user_message, ai_reply)
             empathy_score = float(judged.get("empathy"))
-            empathy_rationale = str(judged.get("rationale") or "").strip() or None
+            empathy_rationale = _clean_opt(judged.get("rationale"))
 
             initial_empathy_score = empathy_score
 
-            retry_enabled = str(os.getenv("RETRY_ON_LOW_EMPATHY", "false")).strip().lower() in {
-                "1",
-                "true",
-                "yes",
-                "on",
-            }
-            retry_threshold = int(os.getenv("RETRY_EMPATHY_THRESHOLD", "3"))
-            retry_threshold = max(1, min(5, retry_threshold))
-
-            if retry_enabled and empathy_score is not None and empathy_score < retry_threshold:
+            if RETRY_ON_LOW_EMPATHY and empathy_score is not None and empathy_score < RETRY_EMPATHY_THRESHOLD:
                 prev_score = int(round(empathy_score))
                 prev_rationale = empathy_rationale or ""
 
-                ai_reply_retry = call_gemini_negotiator_retry(
+                ai_reply_retry = await call_gemini_negotiator_retry(
                     user_msg=request.user_message,
                     goal=request.current_goal,
                     history=request.chat_history,
@@ -1094,9 +2116,9 @@ async def chat_endpoint(request: ChatRequest):
                 )
 
                 # Re-judge the improved response so Opik shows the effect.
-                judged2 = call_gemini_empathy_judge(request.user_message, ai_reply_retry)
+                judged2 = await _judge_empathy_panel(request.user_message, ai_reply_retry)
                 empathy_score = float(judged2.get("empathy"))
-                empathy_rationale = str(judged2.get("rationale") or "").strip() or None
+                empathy_rationale = _clean_opt(judged2.get("rationale"))
                 ai_reply = ai_reply_retry
                 retry_used = True
 
@@ -1109,16 +2131,16 @@ async def chat_endpoint(request: ChatRequest):
             logger.warning(f"⚠ Empathy eval skipped: {e}")
         
         logger.info(f"✓ Chat processed | Goal: {request.current_goal} | Reply length: {len(ai_reply)}")
-        return ChatResponse(
-            response=ai_reply,
-            deal_made=deal_made,
-            deal_label=deal_label,
-            empathy_score=empathy_score,
-            empathy_rationale=empathy_rationale,
-            prompt_version=PROMPT_VERSION,
-            retry_used=retry_used,
-            initial_empathy_score=initial_empathy_score,
-        )
+        return {
+            "response": ai_reply,
+            "deal_made": deal_made,
+            "deal_label": deal_label,
+            "empathy_score": empathy_score,
+            "empathy_rationale": empathy_rationale,
+            "prompt_version": PROMPT_VERSION,
+            "retry_used": retry_used,
+            "initial_empathy_score": initial_empathy_score,
+        }
 
     except HTTPException:
         raise
@@ -1127,59 +2149,168 @@ async def chat_endpoint(request: ChatRequest):
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
+@app.post("/chat/batch", response_model=ChatBatchResponse)
+async def chat_batch_endpoint(request: ChatBatchRequest):
+    """Run several independent /chat cases in one HTTP round trip (used by evals).
+
+    Each case succeeds or fails on its own: a failing case comes back with
+    its status_code/error and no response, the others keep their results.
+    """
+    if not request.cases:
+        raise HTTPException(status_code=400, detail="Batch cannot be empty")
+    if len(request.cases) > CHAT_BATCH_MAX_CASES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Batch too large (max {CHAT_BATCH_MAX_CASES} cases)",
+        )
+
+    outcomes = await asyncio.gather(
+        *(_chat_reply(case) for case in request.cases),
+        return_exceptions=True,
+    )
+    results = []
+    for outcome in outcomes:
+        if isinstance(outcome, HTTPException):
+            results.append({"response": None, "status_code": outcome.status_code, "error": str(outcome.detail)})
+        elif isinstance(outcome, BaseException):
+            logger.error(f"🔥 Unexpected error in /chat/batch case: {outcome!r}")
+            results.append({"response": None, "status_code": 500, "error": "Internal server error"})
+        else:
+            results.append({**outcome, "status_code": 200, "error": None})
+    return _DEFAULT_RESPONSE_CLASS({"results": results})
+
+
+# Below this many messages /progress skips the Gemini summary.
+PROGRESS_INSIGHTS_MIN_CHATS = 3
+
+# Dashboards poll /progress and /progress/motivation with unchanged inputs;
+# results are reused for a few minutes keyed on exactly what the prompt sees.
+SUMMARY_CACHE_TTL_S = float(os.getenv("SUMMARY_CACHE_TTL_S", "600"))
+_insights_cache = TTLCache(ttl_s=SUMMARY_CACHE_TTL_S, max_entries=1024)
+_motivation_cache = TTLCache(ttl_s=SUMMARY_CACHE_TTL_S, max_entries=1024)
+# Identical polls that miss the cache together share one Gemini call.
+_insights_flights = SingleFlight()
+_motivation_flights = SingleFlight()
+
+
+async def _cached_progress_insights(
+    goal: str,
+    history: List[ChatMessage],
+    language: Optional[str],
+) -> dict:
+    key = make_key(
+        PROMPT_VERSION,
+        goal,
+        _normalize_language(language),
+        _history_to_raw_transcript(history),
+    )
+    payload = _insights_cache.get(key)
+    if payload is None:
+
+        async def _fetch() -> dict:
+            result = await call_gemini_progress_insights(goal, history, language=language)
+            _insights_cache.set(key, result)
+            return result
+
+        payload = await _insights_flights.do(key, _fetch)
+    return dict(payload)
+
+
+async def _cached_weekly_motivation(
+    goal: str,
+    completion_rate_7d: float,
+    last7_days: List[DayCompletion],
+    language: Optional[str],
+) -> str:
+    key = make_key(
+        PROMPT_VERSION,
+        goal,
+        f"{completion_rate_7d:.0f}",
+        ",".join([f"{d.date}:{int(bool(d.done))}" for d in last7_days]),
+        _normalize_language(language),
+    )
+    text = _motivation_cache.get(key)
+    if text is None:
+
+        async def _fetch() -> str:
+            result = await call_gemini_weekly_motivation(
+                goal=goal,
+                completion_rate_7d=completion_rate_7d,
+                last7_days=last7_days,
+                language=language,
+            )
+            _motivation_cache.set(key, result)
+            return result
+
+        text = await _motivation_flights.do(key, _fetch)
+    return text
+
+
 @app.post("/progress", response_model=ProgressResponse)
-async def progress_endpoint(request: ChatRequest) -> ProgressResponse:
+async def progress_endpoint(request: ChatRequest):
     """
     Endpoint to analyze chat history and extract progress metrics.
     - Analyzes conversations to extract completion rate
     - Opik logs this analysis for evaluation/observability
     """
     try:
-        if not request.current_goal.strip():
+        if _is_blank(request.current_goal):
             raise HTTPException(status_code=400, detail="Goal must be set")
+        _check_history_size(request.chat_history)
 
         history = request.chat_history
         total_chats = len(history)
 
-        micro_habits_heuristic = _estimate_micro_habits_offered(history)
+        # Start the Gemini call, then run the local heuristic in a worker
+        # thread: awaiting it hands the loop to the insights task, which gets
+        # its request on the wire while the heuristic runs. A near-empty
+        # history has nothing to summarize, so it goes straight to the
+        # fallback bullets.
+        insights_task = None
+        if total_chats >= PROGRESS_INSIGHTS_MIN_CHATS:
+            insights_task = asyncio.create_task(
+                _cached_progress_insights(
+                    request.current_goal,
+                    history,
+                    request.language,
+                )
+            )
+        micro_habits_heuristic = await asyncio.to_thread(_estimate_micro_habits_offered, history)
 
         insights = None
         micro_habits_from_ai: Optional[int] = None
-        try:
-            ai_payload = call_gemini_progress_insights(
-                request.current_goal,
-                history,
-                language=request.language,
-            )
-            insights = ai_payload.get("insights")
-            mh = ai_payload.get("micro_habits_offered")
-            if isinstance(mh, (int, float)):
-                micro_habits_from_ai = int(mh)
-        except Exception as e:
-            logger.warning(f"⚠ Progress insights fallback (Gemini unavailable): {e}")
+        if insights_task is not None:
+            try:
+                ai_payload = await insights_task
+                insights = ai_payload.get("insights")
+                mh = ai_payload.get("micro_habits_offered")
+                if isinstance(mh, (int, float)):
+                    micro_habits_from_ai = int(mh)
+            except Exception as e:
+                logger.warning(f"⚠ Progress insights fallback (Gemini unavailable): {e}")
 
         micro_habits_offered = max(
             micro_habits_heuristic,
             micro_habits_from_ai or 0,
         )
 
-       # Calculate completion rate (capped at 100%)
-        completion_rate = float(min(100.0, (min(total_chats, 10) / 10.0) * 100.0))
+        # Completion rate: 10 chats = 100%.
+        completion_rate = min(total_chats, 10) * 10.0
 
         insights_text = _coerce_insights_bullets(insights)
         if not insights_text:
-            insights_text = "- Keep the habit tiny today.\n- Pick one micro-step and do it now.\n- Consistency beats intensity."
-
-        progress_data = ProgressData(
-            goal=request.current_goal,
-            total_chats=total_chats,
-            micro_habits_offered=micro_habits_offered,
-            completion_rate=completion_rate,
-            last_interaction="recent",
-            insights=insights_text,
-        )
+            insights_text = _DEFAULT_INSIGHTS
 
-        return ProgressResponse(status="success", data=progress_data)
+        progress_data = {
+            "goal": request.current_goal,
+            "total_chats": total_chats,
+            "micro_habits_offered": micro_habits_offered,
+            "completion_rate": completion_rate,
+            "last_interaction": "recent",
+            "insights": insights_text,
+        }
+
+        return _DEFAULT_RESPONSE_CLASS({"status": "success", "data": progress_data})
 
     except HTTPException:
         raise
@@ -1189,34 +2320,31 @@ async def progress_endpoint(request: ChatRequest) -> ProgressResponse:
 
 
 @app.post("/progress/motivation", response_model=WeeklyMotivationResponse)
-async def weekly_motivation_endpoint(
-    request: WeeklyMotivationRequest,
-) -> WeeklyMotivationResponse:
+async def weekly_motivation_endpoint(request: WeeklyMotivationRequest):
     try:
-        if not request.goal.strip():
+        if _is_blank(request.goal):
             raise HTTPException(status_code=400, detail="Goal must be set")
 
         # Clamp to sane range to avoid prompt injection via absurd numbers.
         rate = float(max(0.0, min(100.0, request.completion_rate_7d)))
 
         try:
-            motivation = call_gemini_weekly_motivation(
-                goal=request.goal,
-                completion_rate_7d=rate,
-                last7_days=request.last7_days,
-                language=request.language,
+            motivation = await _cached_weekly_motivation(
+                request.goal,
+                rate,
+                request.last7_days,
+                request.language,
             )
         except Exception as e:
             logger.warning(f"⚠ Weekly motivation fallback (Gemini unavailable): {e}")
-            motivation = "Keep it tiny today—one small action keeps the habit alive."
+            motivation = _DEFAULT_MOTIVATION
 
         # Fallback if model returns something unexpected.
-        if not motivation or not str(motivation).strip():
-            motivation = "Keep it tiny today—one small action keeps the habit alive."
+        if _is_blank(motivation):
+            motivation = _DEFAULT_MOTIVATION
 
-        return WeeklyMotivationResponse(
-            status="success",
-            data=WeeklyMotivationData(motivation=str(motivation).strip()),
+        return _DEFAULT_RESPONSE_CLASS(
+            {"status": "success", "data": {"motivation": _clean_str(motivation)}}
         )
 
     except HTTPException:
@@ -1227,26 +2355,21 @@ async def weekly_motivation_endpoint(
 
 
 @app.post("/persona", response_model=PersonaResponse)
-async def persona_endpoint(request: PersonaRequest) -> PersonaResponse:
+async def persona_endpoint(request: PersonaRequest):
     try:
-        if not request.current_goal.strip():
+        if _is_blank(request.current_goal):
             raise HTTPException(status_code=400, detail="Goal must be set")
+        _check_history_size(request.chat_history)
 
         # Clamp to sane ranges.
         rate = float(max(0.0, min(100.0, request.completion_rate_7d)))
         request.completion_rate_7d = rate
-        request.streak = int(max(0, min(3650, request.streak)))
-
-        persona = call_gemini_persona(request)
+        request.streak = _clean_int(request.streak, 0, 0, 3650)
 
-        data = PersonaData(
-            archetype_title=str(persona.get("archetype_title") or "").strip(),
-            description=str(persona.get("description") or "").strip(),
-            avatar_id=str(persona.get("avatar_id") or "").strip(),
-            power_level=int(persona.get("power_level") or 50),
-        )
+        # call_gemini_persona already returns cleaned, clamped fields.
+        data = await call_gemini_persona(request)
 
-        return PersonaResponse(status="success", data=data)
+        return _DEFAULT_RESPONSE_CLASS({"status": "success", "data": data})
 
     except HTTPException:
         raise
@@ -1257,4 +2380,12 @@ async def persona_endpoint(request: PersonaRequest) -> PersonaResponse:
 
 if __name__ == "__main__":
     logger.info("🚀 Starting FlexiFit Backend...")
-    uvicorn.run(app, host="0.0.0.0", port=int(os.getenv("PORT", 8000)))
\ No newline at end of file
+    # Workers need an import string; each one is a separate process with its
+    # own caches and GEMINI_MAX_CONCURRENCY budget (set REDIS_URL to share
+    # negotiator replies). uvicorn[standard] picks uvloop/httptools when available.
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=int(os.getenv("PORT", 8000)),
+        workers=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 2)),
+    )
\ No newline at end of file